@@ -0,0 +1,187 @@
+"""Memory and construction time of the entity classes.
+
+Several seasons of league-wide history are generated as the parsed rows of
+KHLParser.get_data and built into KHLEvent and KHLPlayer objects, the results
+are compared with the per-instance dict classes used before:
+
+    python -m benchmarks.entities --seasons 5
+
+"""
+
+
+import argparse
+import gc
+import random
+import sys
+import tracemalloc
+
+from datetime import datetime, timedelta
+
+from benchmarks.run import measure
+from khl_team import KHLEvent
+from khl_team.khl import KHLPlayer
+from khl_team.stats import parse_player_stats
+
+
+TEAMS = 28
+MATCHES = 56
+PLAYERS = 35
+
+
+class DictEvent(object):
+    """Event class with __dict__ and strptime (the previous layout)."""
+
+    _TODAY = datetime.today()
+
+    def __init__(self, **kwargs):
+        self.teams = kwargs['teams']
+        self.score = kwargs['score']
+        self.datetime = datetime.strptime(
+            '%s:%s' % (kwargs['date'], kwargs['time']), '%d.%m.%Y:%H:%M'
+        )
+        self.is_finished = DictEvent._TODAY > self.datetime
+        self.winner = None
+        if self.is_finished and self.score[0] != self.score[1]:
+            self.winner = self.teams[0] if self.score[0] > self.score[1] \
+                else self.teams[1]
+
+
+class DictPlayer(object):
+    """Player class with __dict__ (the previous layout)."""
+
+    def __init__(self, **kwargs):
+        self.name = None
+        self.team = None
+        self.f_name = None
+        self.l_name = None
+        self.number = None
+        self.role = None
+        self.date_birth = None
+        self.nationality = None
+        self.height = None
+        self.weight = None
+        self.stats = None
+        for attr in kwargs:
+            setattr(self, attr, kwargs[attr])
+        self.stats_record = parse_player_stats(self.stats)
+        split_name = self.name.split()
+        self.f_name = split_name[0]
+        self.l_name = split_name[2] if len(split_name) == 3 else split_name[1]
+
+
+def gen_matches(seasons, seed=0):
+    """Generates the match dicts of the league.
+
+    :param seasons: number of seasons;
+    :param seed: random seed;
+    :return: list of dicts with keys: date, time, teams, score.
+
+    """
+    rnd = random.Random(seed)
+    teams = ['Команда %d' % num for num in range(TEAMS)]
+    start = datetime(2010, 9, 1)
+    matches = []
+    for season in range(seasons):
+        for num in range(TEAMS * MATCHES // 2):
+            date_time = start + timedelta(days=season * 365 + num // 7,
+                                          hours=rnd.choice((17, 19, 20)))
+            home, away = rnd.sample(teams, 2)
+            matches.append({
+                'date': date_time.strftime('%d.%m.%Y'),
+                'time': date_time.strftime('%H:%M'),
+                'teams': (home, away),
+                'score': (rnd.randint(0, 6), rnd.randint(0, 6))
+            })
+    return matches
+
+
+def gen_players(seasons, seed=0):
+    """Generates the player dicts of the league.
+
+    :param seasons: number of seasons;
+    :param seed: random seed;
+    :return: list of dicts of KHLParser.get_data.
+
+    """
+    rnd = random.Random(seed)
+    return [{
+        'team': 'Команда %d' % (num % TEAMS),
+        'number': num % 99 + 1,
+        'name': 'Имя%d Отчество Фамилия%d' % (num, num),
+        'role': rnd.choice(('вратарь', 'защитник', 'нападающий')),
+        'nationality': 'Россия',
+        'date_birth': '01.01.1990',
+        'height': '185',
+        'weight': '90',
+        'stats': {'games': '50', 'goals': '10', 'tbl': '+3',
+                  'assist': '12', 'goals_pass': '22', 'penalty': '14'}
+    } for num in range(seasons * TEAMS * PLAYERS)]
+
+
+def allocated(build):
+    """Measures the memory kept by the built objects.
+
+    :param build: callable returning the objects;
+    :return: tuple(objects, bytes).
+
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        objects = build()
+        return objects, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def run(repeat, seasons):
+    """Runs the benchmarks.
+
+    :return: dict (key - benchmark name, value - dict with keys: time,
+    bytes, count).
+
+    """
+    matches, players = gen_matches(seasons), gen_players(seasons)
+    cases = {
+        'event.dict': lambda: [DictEvent(**match) for match in matches],
+        'event.slots': lambda: KHLEvent.from_rows(matches),
+        'player.dict': lambda: [DictPlayer(**player) for player in players],
+        'player.slots': lambda: KHLPlayer.from_rows(players)
+    }
+    results = {}
+    for name, build in cases.items():
+        objects, size = allocated(build)
+        results[name] = {
+            'time': measure(build, repeat)['median'],
+            'bytes': size,
+            'count': len(objects)
+        }
+        del objects
+    return results
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description='Memory and construction time of the entity classes.')
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    arg_parser.add_argument('--seasons', type=int, default=5)
+    args = arg_parser.parse_args(argv)
+
+    results = run(args.repeat, args.seasons)
+    print('%-14s %8s %12s %12s' % ('', 'objects', 'time, s', 'bytes/obj'))
+    for name in sorted(results):
+        result = results[name]
+        print('%-14s %8d %12.6f %12.1f' % (
+            name, result['count'], result['time'],
+            result['bytes'] / result['count']))
+    for kind in ('event', 'player'):
+        old, new = results[kind + '.dict'], results[kind + '.slots']
+        print('%s: %.1fx faster, %.1f%% less memory' % (
+            kind, old['time'] / new['time'],
+            (1 - new['bytes'] / old['bytes']) * 100))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""Offline benchmarks.
+
+The benchmarks run against the local stand-in of championat.com serving the
+recorded pages, so no network access is needed:
+
+    python -m benchmarks.run --save results.json
+    python -m benchmarks.run --compare results.json
+
+The pages captured by RecordingTransport are replayed without the server:
+
+    python -m benchmarks.run --replay pages.zip --latency 0.05
+
+Each benchmark reports the minimum and the median time of one operation in
+seconds. Results can be saved and compared with a previous run, the
+comparison fails when the median of any benchmark is slower than the
+threshold.
+
+"""
+
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+from benchmarks.server import FixtureServer
+from khl_team import KHLEvent, KHLLeague, KHLTeam
+from khl_team.archive import PageArchive
+from khl_team.exceptions import MatchNotExistError, PlayerNotExistError
+from khl_team.parser import KHLParser
+from khl_team.transport import ReplayTransport
+
+
+TEAM = 'Локомотив'
+PAGES = ('teams', 'matches', 'players', 'p_stats', 't_stats')
+# Extractors of each page in the order of KHLParser.get_data.
+EXTRACTORS = {
+    'teams': ('_parse_teams',),
+    'matches': ('_parse_matches', '_parse_meta'),
+    'players': ('_parse_players',),
+    'p_stats': ('_parse_players_stat',),
+    't_stats': ('_parse_team_stat',)
+}
+QUERIES = 1000
+
+
+def measure(func, repeat, number=1, setup=None):
+    """Measures the time of one operation.
+
+    :param func: callable;
+    :param repeat: number of measurements;
+    :param number: number of operations performed by one call;
+    :param setup: callable called before each measurement without timing,
+    its result is the argument of func;
+    :return: dict with keys: min, median, repeat.
+
+    """
+    times = []
+    for _ in range(repeat):
+        args = (setup(),) if setup else ()
+        start = time.perf_counter()
+        func(*args)
+        times.append((time.perf_counter() - start) / number)
+    return {
+        'min': min(times),
+        'median': statistics.median(times),
+        'repeat': repeat
+    }
+
+
+def bench_pages(repeat, options):
+    """Measures fetch, parse and extract time of each page."""
+
+    results = {}
+    parser = KHLParser(TEAM, **options)
+    team_dict = parser._get_teams_dict()[0]
+    urls = dict(team_dict['urls'], teams=parser._get_url(key='teams'))
+    for kind in PAGES:
+        url = urls[kind]
+        html = parser.transport.fetch(url)[2]
+        soup = parser._parse_html(html, kind)
+        results['fetch.%s' % kind] = measure(
+            lambda: parser.transport.fetch(url), repeat)
+        results['parse.%s' % kind] = measure(
+            lambda: parser._parse_html(html, kind), repeat)
+        parser._get_soup = lambda *args: soup
+
+        def extract():
+            parser._team_dict = team_dict
+            for name in EXTRACTORS[kind]:
+                getattr(parser, name)()
+
+        results['extract.%s' % kind] = measure(extract, repeat)
+        del parser._get_soup
+    return results
+
+
+def bench_team(repeat, options):
+    """Measures the construction of KHLTeam."""
+
+    return {'team.load': measure(lambda: KHLTeam(TEAM, **options), repeat)}
+
+
+def bench_league(repeat, options, workers, processes=None):
+    """Measures the load of all teams of the league."""
+
+    return {'league.load': measure(
+        lambda: KHLLeague(workers=workers, processes=processes, **options),
+        repeat)}
+
+
+def bench_queries(repeat, options):
+    """Measures the throughput of the match and player queries."""
+
+    team = KHLTeam(TEAM, **options)
+    rnd = random.Random(0)
+    opponents = [rnd.choice(team.matches).teams[rnd.randint(0, 1)]
+                 for _ in range(QUERIES)]
+    numbers = [rnd.choice(team.players).number for _ in range(QUERIES)]
+
+    def get_match():
+        for opponent in opponents:
+            try:
+                team.get_match(opponent=opponent, result='won')
+            except MatchNotExistError:
+                pass
+
+    def get_player():
+        for number in numbers:
+            try:
+                team.get_player(number=number)
+            except PlayerNotExistError:
+                pass
+
+    return {
+        'query.get_match': measure(get_match, repeat, QUERIES),
+        'query.get_player': measure(get_player, repeat, QUERIES)
+    }
+
+
+def bench_ics(repeat, options):
+    """Measures the generation of the ics file.
+
+    The events are built anew for each measurement, so the serialized
+    events cached by KHLEvent.to_ics are not reused.
+
+    """
+    matches = [match.to_data() for match in KHLTeam(TEAM, **options).matches]
+    return {'ics.gen_ics': measure(
+        KHLEvent.gen_ics, repeat, setup=lambda: KHLEvent.from_rows(matches))}
+
+
+def run(repeat, backend='html.parser', workers=None, latency=0,
+        processes=None, replay=None):
+    """Runs all benchmarks.
+
+    :param replay: path of PageArchive served instead of the local server;
+    :return: dict (key - benchmark name, value - measurement).
+
+    """
+    if replay:
+        with ReplayTransport(PageArchive(replay), latency) as transport:
+            return run_all(repeat, {'backend': backend,
+                                    'transport': transport},
+                           workers, processes)
+    with FixtureServer(latency=latency) as server:
+        return run_all(repeat, {'backend': backend, 'base_url': server.url},
+                       workers, processes)
+
+
+def run_all(repeat, options, workers=None, processes=None):
+    """Runs all benchmarks with the keyword arguments of the parser.
+
+    :return: dict (key - benchmark name, value - measurement).
+
+    """
+    results = {}
+    results.update(bench_pages(repeat, options))
+    results.update(bench_team(repeat, options))
+    results.update(bench_league(max(1, repeat // 5), options, workers,
+                                processes))
+    results.update(bench_queries(repeat, options))
+    results.update(bench_ics(repeat, options))
+    return results
+
+
+def compare(results, previous, threshold):
+    """Compares the medians with the previous run.
+
+    :return: list of the names of regressed benchmarks.
+
+    """
+    regressions = []
+    for name in sorted(results):
+        if name not in previous:
+            continue
+        old, new = previous[name]['median'], results[name]['median']
+        change = (new - old) / old * 100 if old else 0
+        mark = ''
+        if change > threshold:
+            mark = '  REGRESSION'
+            regressions.append(name)
+        print('%-24s %12.6f %12.6f %+8.1f%%%s' % (name, old, new, change,
+                                                    mark))
+    return regressions
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description='Offline benchmarks of khl_team.')
+    arg_parser.add_argument('--repeat', type=int, default=10)
+    arg_parser.add_argument('--backend', default='html.parser')
+    arg_parser.add_argument('--workers', type=int, default=None,
+                            help='threads of the league load')
+    arg_parser.add_argument('--processes', type=int, default=None,
+                            help='processes extracting the league pages')
+    arg_parser.add_argument('--latency', type=float, default=0,
+                            help='delay of each response in seconds')
+    arg_parser.add_argument('--replay', metavar='ARCHIVE',
+                            help='serve the pages of the recorded archive')
+    arg_parser.add_argument('--save', metavar='FILE',
+                            help='save results in JSON file')
+    arg_parser.add_argument('--compare', metavar='FILE',
+                            help='compare with results of a previous run')
+    arg_parser.add_argument('--threshold', type=float, default=10,
+                            help='allowed slowdown in percent')
+    args = arg_parser.parse_args(argv)
+
+    results = run(args.repeat, args.backend, args.workers, args.latency,
+                  args.processes, args.replay)
+    for name in sorted(results):
+        print('%-24s min %.6f  median %.6f' % (
+            name, results[name]['min'], results[name]['median']))
+    if args.save:
+        with open(args.save, 'w', encoding='UTF-8') as file_:
+            json.dump({
+                'python': platform.python_version(),
+                'backend': args.backend,
+                'results': results
+            }, file_, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare, 'r', encoding='UTF-8') as file_:
+            previous = json.load(file_)['results']
+        print()
+        if compare(results, previous, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Local stand-in of championat.com.
+
+The server serves the recorded pages from the fixtures directory: the teams
+index for the teams URL and the same set of team pages for every team URL.
+
+"""
+
+
+import os
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Request handler serving the fixture with the name of the URL page."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        name = os.path.basename(self.path.split('?')[0])
+        path = os.path.join(self.server.fixtures, name)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, 'rb') as file_:
+            body = file_.read()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.server.requests += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """HTTP server of the fixtures running in a background thread."""
+
+    daemon_threads = True
+
+    def __init__(self, fixtures=FIXTURES, latency=0, port=0):
+        """Initial instance.
+
+        :param fixtures: directory of the recorded pages;
+        :param latency: delay of each response in seconds;
+        :param port: port number, by default any free port.
+
+        """
+        super().__init__(('127.0.0.1', port), FixtureHandler)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.requests = 0
+        self._thread = None
+
+    @property
+    def url(self):
+        """Base URL of the server."""
+
+        return 'http://%s:%d/' % self.server_address
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--port', type=int, default=8000)
+    arg_parser.add_argument('--latency', type=float, default=0)
+    args = arg_parser.parse_args()
+    server = FixtureServer(latency=args.latency, port=args.port)
+    print('Serving %s on %s' % (server.fixtures, server.url))
+    server.serve_forever()
@@ -0,0 +1,80 @@
+"""Startup time of the package.
+
+Each statement is run in a fresh interpreter, the time of the import and the
+number of the imported modules are compared with the budget:
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --repeat 20 --scale 2
+
+The time is the minimum of the runs, the check fails when any statement is
+over its budget.
+
+"""
+
+
+import argparse
+import json
+import subprocess
+import sys
+
+
+# Statement, budget of the import time in seconds and of the modules.
+BUDGETS = (
+    ('import khl_team', 0.01, 5),
+    ('from khl_team import TeamNotExistError', 0.01, 5),
+    ('from khl_team import snapshot', 0.02, 10),
+    ('from khl_team import KHLTeam', 0.06, 60),
+    ('from khl_team.parser import KHLParser', 0.3, 300)
+)
+PROBE = '''
+import json, sys, time
+modules = set(sys.modules)
+start = time.perf_counter()
+%s
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, len(set(sys.modules) - modules)]))
+'''
+
+
+def measure(statement, repeat):
+    """Measures the statement in fresh interpreters.
+
+    :param statement: Python statement;
+    :param repeat: number of interpreters;
+    :return: tuple(min time in seconds, number of the imported modules).
+
+    """
+    times = []
+    modules = 0
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE % statement],
+            check=True, stdout=subprocess.PIPE).stdout
+        elapsed, modules = json.loads(output)
+        times.append(elapsed)
+    return min(times), modules
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description='Startup time of khl_team against the budget.')
+    arg_parser.add_argument('--repeat', type=int, default=10)
+    arg_parser.add_argument('--scale', type=float, default=1,
+                            help='multiplier of the time budget')
+    args = arg_parser.parse_args(argv)
+
+    failed = False
+    print('%-40s %10s %8s %10s %8s' % (
+        'statement', 'time, s', 'modules', 'budget, s', 'modules'))
+    for statement, budget, max_modules in BUDGETS:
+        elapsed, modules = measure(statement, args.repeat)
+        over = elapsed > budget * args.scale or modules > max_modules
+        failed = failed or over
+        print('%-40s %10.4f %8d %10.4f %8d%s' % (
+            statement, elapsed, modules, budget * args.scale, max_modules,
+            '  OVER BUDGET' if over else ''))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,59 @@
-try:
-    from .khl import KHLTeam, KHLEvent
-except ImportError:
-    pass
+"""KHL teams data interface.
+
+Public classes are imported on the first access of the attribute (PEP 562),
+so the exceptions and the snapshots do not import icalendar, BeautifulSoup
+and the HTTP transport.
+
+"""
+
+
 from .exceptions import (
     TeamNotExistError,
     MatchNotExistError,
-    PlayerNotExistError
+    PlayerNotExistError,
+    SnapshotError,
+    TransportError
 )
 
 __version__ = '1.0'
+
+# Lazy attributes: name and the module defining it.
+_LAZY = {
+    'KHLTeam': 'khl',
+    'KHLEvent': 'khl',
+    'KHLLeague': 'khl',
+    'PageCache': 'cache',
+    'TeamCache': 'cache',
+    'PageArchive': 'archive',
+    'HTTPTransport': 'transport',
+    'RateLimiter': 'transport',
+    'RecordingTransport': 'transport',
+    'ReplayTransport': 'transport'
+}
+
+__all__ = [
+    'TeamNotExistError',
+    'MatchNotExistError',
+    'PlayerNotExistError',
+    'SnapshotError',
+    'TransportError'
+] + list(_LAZY)
+
+
+def __getattr__(name):
+    """Imports the module of the lazy attribute."""
+
+    try:
+        module = _LAZY[name]
+    except KeyError:
+        raise AttributeError(
+            'module %r has no attribute %r' % (__name__, name))
+    from importlib import import_module
+
+    value = getattr(import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
@@ -0,0 +1,141 @@
+"""Archive module.
+
+This module stores the fetched pages in one zip file, so the traffic of a
+load can be captured and replayed offline (see RecordingTransport and
+ReplayTransport of khl_team.transport).
+
+Each record takes two members: 'NNNNNNNN.json' with the URL, the status and
+the response headers and 'NNNNNNNN.body' with the decoded page. A URL
+recorded several times is replayed by its last record.
+
+"""
+
+
+import http.client
+import json
+import threading
+import zipfile
+
+from urllib.parse import urlsplit
+
+from khl_team.exceptions import TransportError
+
+
+class PageArchive(object):
+    """Zip archive of the fetched pages."""
+
+    # Headers describing the transfer of the original response.
+    _SKIP_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding',
+                     'connection', 'keep-alive')
+
+    def __init__(self, path, mode='r'):
+        """Initial instance.
+
+        :param path: file path;
+        :param mode: 'r' to read, 'a' to append records, 'w' to overwrite.
+
+        """
+        if mode not in ('r', 'a', 'w'):
+            raise ValueError('unknown mode "%s"' % mode)
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        try:
+            self._zip = zipfile.ZipFile(path, mode, zipfile.ZIP_DEFLATED)
+        except (OSError, zipfile.BadZipFile) as error:
+            raise TransportError('%s: %s' % (path, error))
+        self._records = {}
+        self._count = 0
+        if mode != 'w':
+            self._read_index()
+
+    def add(self, url, status, headers, body):
+        """Appends the record of the page.
+
+        :param url: page URL;
+        :param status: response status;
+        :param headers: response headers;
+        :param body: decoded byte string.
+
+        """
+        meta = {
+            'url': url,
+            'status': status,
+            'headers': [
+                (name, value) for name, value in headers.items()
+                if name.lower() not in PageArchive._SKIP_HEADERS
+            ]
+        }
+        with self._lock:
+            name = '%08d' % self._count
+            self._zip.writestr(name + '.json', json.dumps(meta))
+            self._zip.writestr(name + '.body', body)
+            self._count += 1
+            self._records[PageArchive.get_key(url)] = (meta, body)
+
+    def get(self, url):
+        """Gets the record of the URL, the host of the URL is ignored.
+
+        :param url: page URL;
+        :return: tuple(status, headers, body) or None.
+
+        """
+        record = self._records.get(PageArchive.get_key(url))
+        if record is None:
+            return None
+        meta, body = record
+        headers = http.client.HTTPMessage()
+        for name, value in meta['headers']:
+            headers[name] = value
+        return meta['status'], headers, body
+
+    @property
+    def urls(self):
+        """URLs of the records."""
+
+        return [meta['url'] for meta, _ in self._records.values()]
+
+    def close(self):
+        with self._lock:
+            self._zip.close()
+
+    @staticmethod
+    def get_key(url):
+        """Gets the key of the URL: path and query.
+
+        :param url: page URL;
+        :return: string.
+
+        """
+        parts = urlsplit(url)
+        return parts.path + ('?' + parts.query if parts.query else '')
+
+    def _read_index(self):
+        """Reads the records, the last record of the URL wins."""
+
+        names = sorted(name[:-5] for name in self._zip.namelist()
+                       if name.endswith('.json'))
+        for name in names:
+            try:
+                meta = json.loads(self._zip.read(name + '.json'))
+                body = self._zip.read(name + '.body')
+            except (KeyError, ValueError, zipfile.BadZipFile) as error:
+                raise TransportError('%s: %s' % (self.path, error))
+            self._records[PageArchive.get_key(meta['url'])] = (meta, body)
+        self._count = int(names[-1]) + 1 if names else 0
+
+    def __len__(self):
+        return len(self._records)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __str__(self):
+        return '%s(%s, %d pages)' % (
+            self.__class__.__name__, self.path, len(self))
+
+    def __repr__(self):
+        return self.__str__()
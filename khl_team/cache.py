@@ -0,0 +1,558 @@
+"""Cache module.
+
+This module contains a persistent on-disk cache of the championat.com pages.
+Pages are stored by the digest of their content, the metadata of each URL
+(digest of the page, ETag, Last-Modified, time of fetching) is stored by the
+digest of the URL.
+
+TeamCache keeps the loaded KHLTeam instances in memory of the process, so
+concurrent requests for one team share one load.
+
+"""
+
+
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from collections import OrderedDict
+
+
+logger = logging.getLogger(__name__)
+
+
+class PageCache(object):
+    """On-disk page cache.
+
+    Fresh pages (younger than TTL of their kind) are read from the disk,
+    expired pages are revalidated with If-None-Match/If-Modified-Since
+    headers. When the total size of the stored pages exceeds the limit,
+    least recently used pages are evicted.
+
+    """
+
+    _TTL = {
+        'teams': 24 * 60 * 60,
+        'matches': 60 * 60,
+        'players': 12 * 60 * 60,
+        'p_stats': 60 * 60,
+        't_stats': 60 * 60
+    }
+    _MAX_SIZE = 64 * 1024 * 1024
+
+    def __init__(self, path=None, ttl=None, max_size=None):
+        """Initial instance.
+
+        :param path: cache directory, by default 'khl_team' in the temporary
+        directory;
+        :param ttl: dict (key - kind of page, value - seconds), updates the
+        default TTL;
+        :param max_size: limit of the pages size in bytes.
+
+        """
+        self.path = path if path else os.path.join(
+            tempfile.gettempdir(), 'khl_team')
+        self.ttl = dict(PageCache._TTL, **(ttl if ttl else {}))
+        self.max_size = max_size if max_size else PageCache._MAX_SIZE
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        for directory in ('index', 'pages'):
+            os.makedirs(os.path.join(self.path, directory), exist_ok=True)
+
+    def get(self, url, kind, fetch):
+        """Gets the page body.
+
+        :param url: page URL;
+        :param kind: kind of page (key of TTL);
+        :param fetch: callable(url, headers) returning tuple(status, headers,
+        body);
+        :return: byte string.
+
+        """
+        entry, body, headers = self._lookup(url, kind)
+        if entry is not None and headers is None:
+            return body
+        return self._complete(url, entry, body, fetch(url, headers))
+
+    async def aget(self, url, kind, afetch):
+        """Gets the page body without blocking the event loop.
+
+        The files of the cache are read, written and evicted in the default
+        executor, so a slow disk does not stall the other fetches.
+
+        :param url: page URL;
+        :param kind: kind of page (key of TTL);
+        :param afetch: coroutine function(url, headers) returning
+        tuple(status, headers, body);
+        :return: byte string.
+
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        entry, body, headers = await loop.run_in_executor(
+            None, self._lookup, url, kind)
+        if entry is not None and headers is None:
+            return body
+        response = await afetch(url, headers)
+        return await loop.run_in_executor(
+            None, self._complete, url, entry, body, response)
+
+    def _lookup(self, url, kind):
+        """Reads the stored page.
+
+        :param url: page URL;
+        :param kind: kind of page (key of TTL);
+        :return: tuple(entry, body, headers), headers of the request are
+        None if the page is fresh, entry is None if the page is not stored.
+
+        """
+        entry = self._read_entry(url)
+        body = self._read_page(entry['digest']) if entry else None
+        if body is None:
+            return None, None, {}
+        if time.time() - entry['fetched'] < self.ttl.get(kind, 0):
+            self._count('hits')
+            self._touch(url)
+            return entry, body, None
+        return entry, body, self._conditional(entry)
+
+    def _complete(self, url, entry, body, response):
+        """Stores the response of the request.
+
+        :param url: page URL;
+        :param entry: stored metadata or None;
+        :param body: stored page or None;
+        :param response: tuple(status, headers, body);
+        :return: byte string.
+
+        """
+        status, headers, new_body = response
+        if entry is not None and status == 304:
+            self._count('hits', 'revalidations')
+            entry['fetched'] = time.time()
+            self._write_entry(url, entry)
+            return body
+        self._count('misses')
+        self._store(url, headers, new_body)
+        return new_body
+
+    def clear(self):
+        """Removes all stored pages."""
+
+        for directory in ('index', 'pages'):
+            dir_path = os.path.join(self.path, directory)
+            for name in os.listdir(dir_path):
+                os.remove(os.path.join(dir_path, name))
+
+    def _store(self, url, headers, body):
+        """Writes the page and its metadata, then evicts old pages.
+
+        :param url: page URL;
+        :param headers: response headers;
+        :param body: byte string.
+
+        """
+        digest = hashlib.sha1(body).hexdigest()
+        page_path = self._page_path(digest)
+        if not os.path.exists(page_path):
+            self._write_file(page_path, body)
+        self._write_entry(url, {
+            'url': url,
+            'digest': digest,
+            'size': len(body),
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'fetched': time.time()
+        })
+        with self._lock:
+            self._evict()
+
+    def _count(self, *counters):
+        """Increments the counters."""
+
+        with self._lock:
+            for counter in counters:
+                setattr(self, counter, getattr(self, counter) + 1)
+
+    def _evict(self):
+        """Removes least recently used pages over the size limit."""
+
+        entries = []
+        for name in os.listdir(os.path.join(self.path, 'index')):
+            path = os.path.join(self.path, 'index', name)
+            try:
+                entries.append(
+                    (os.path.getmtime(path), path, self._load(path)))
+            except (OSError, ValueError):
+                continue
+        pages = {}
+        for _, _, entry in entries:
+            pages[entry['digest']] = entry['size']
+        size = sum(pages.values())
+        entries.sort(key=lambda item: item[0])
+        for _, path, entry in entries:
+            if size <= self.max_size:
+                break
+            os.remove(path)
+            self.evictions += 1
+            digest = entry['digest']
+            if not any(e['digest'] == digest and os.path.exists(p)
+                       for _, p, e in entries):
+                size -= pages.pop(digest, 0)
+                try:
+                    os.remove(self._page_path(digest))
+                except OSError:
+                    pass
+
+    @staticmethod
+    def _conditional(entry):
+        """Creates headers of a conditional request.
+
+        :param entry: metadata of the page;
+        :return: dict of headers.
+
+        """
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def _read_entry(self, url):
+        try:
+            return self._load(self._entry_path(url))
+        except (OSError, ValueError):
+            return None
+
+    def _write_entry(self, url, entry):
+        self._write_file(
+            self._entry_path(url), json.dumps(entry).encode('utf-8'))
+
+    def _read_page(self, digest):
+        try:
+            with open(self._page_path(digest), 'rb') as file_:
+                return file_.read()
+        except OSError:
+            return None
+
+    def _touch(self, url):
+        try:
+            os.utime(self._entry_path(url))
+        except OSError:
+            pass
+
+    def _entry_path(self, url):
+        name = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, 'index', name)
+
+    def _page_path(self, digest):
+        return os.path.join(self.path, 'pages', digest)
+
+    @staticmethod
+    def _load(path):
+        with open(path, 'rb') as file_:
+            return json.loads(file_.read().decode('utf-8'))
+
+    @staticmethod
+    def _write_file(path, data):
+        """Writes the file atomically."""
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as file_:
+            file_.write(data)
+        os.replace(tmp_path, path)
+
+    def __str__(self):
+        return '%s(%s, hits=%d, misses=%d)' % (
+            self.__class__.__name__, self.path, self.hits, self.misses)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class TeamCache(object):
+    """Thread-safe in-memory LRU cache of the teams.
+
+    Concurrent misses of one team wait for a single load. Expired teams are
+    returned while a new instance is loaded in the background, until they
+    are older than TTL and the stale period. Least recently used teams are
+    evicted over the limits of the number of teams and the estimated
+    memory.
+
+    """
+
+    _MAX_ENTRIES = 64
+    _MAX_MEMORY = 256 * 1024 * 1024
+    _TTL = 15 * 60
+    _STALE = 60 * 60
+
+    def __init__(self, max_entries=None, max_memory=None, ttl=None,
+                 stale=None, loader=None, **kwargs):
+        """Initial instance.
+
+        :param max_entries: max number of teams;
+        :param max_memory: max estimated size of the teams in bytes;
+        :param ttl: seconds of the team being fresh;
+        :param stale: seconds of the expired team being returned while it
+        is reloaded, 0 to reload on the request;
+        :param loader: callable(title) returning the team, by default
+        KHLTeam(title, **kwargs);
+        :param kwargs: keyword arguments of KHLTeam.
+
+        """
+        self.max_entries = max_entries if max_entries \
+            else TeamCache._MAX_ENTRIES
+        self.max_memory = max_memory if max_memory \
+            else TeamCache._MAX_MEMORY
+        self.ttl = TeamCache._TTL if ttl is None else ttl
+        self.stale = TeamCache._STALE if stale is None else stale
+        self.loader = loader if loader else self._load_team
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.load_time = 0.0
+        self.load_max = 0.0
+        self.memory = 0
+        self._kwargs = kwargs
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def get(self, title):
+        """Gets the team.
+
+        :param title: team title;
+        :return: team instance, errors of the load are raised.
+
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(title)
+            if entry is not None:
+                age = now - entry[2]
+                if age < self.ttl + self.stale:
+                    self._entries.move_to_end(title)
+                    self.hits += 1
+                    if age >= self.ttl:
+                        self.stale_hits += 1
+                        self._revalidate(title)
+                    return entry[0]
+            self.misses += 1
+            flight = self._flights.get(title)
+            owner = flight is None
+            if owner:
+                flight = self._flights[title] = _Flight()
+        if owner:
+            self._run(title, flight)
+        return flight.wait()
+
+    def invalidate(self, title):
+        """Drops the team, the next request loads it again.
+
+        :param title: team title.
+
+        """
+        with self._lock:
+            entry = self._entries.pop(title, None)
+            if entry is not None:
+                self.memory -= entry[1]
+
+    def clear(self):
+        """Drops all teams."""
+
+        with self._lock:
+            self._entries.clear()
+            self.memory = 0
+
+    def to_dict(self):
+        """Exports the metrics.
+
+        :return: dict.
+
+        """
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'memory': self.memory,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale_hits': self.stale_hits,
+                'evictions': self.evictions,
+                'loads': self.loads,
+                'load_errors': self.load_errors,
+                'load_avg': self.load_time / self.loads if self.loads
+                else 0.0,
+                'load_max': self.load_max
+            }
+
+    def _revalidate(self, title):
+        """Starts the background load of the expired team, called under the
+        lock.
+
+        """
+        if title in self._flights:
+            return
+        flight = self._flights[title] = _Flight()
+        threading.Thread(target=self._run, args=(title, flight),
+                         name='khl_team-revalidate', daemon=True).start()
+
+    def _run(self, title, flight):
+        """Loads the team and stores it, then releases the waiters.
+
+        :param title: team title;
+        :param flight: _Flight instance of the load.
+
+        """
+        start = time.perf_counter()
+        try:
+            team = self.loader(title)
+            # Transport, cache and instrument of the team are shared.
+            size = estimate_size(
+                team, getattr(team, '_kwargs', {}).values())
+        except Exception as error:
+            logger.debug('load of %s failed: %s', title, error)
+            with self._lock:
+                self.load_errors += 1
+                self._flights.pop(title, None)
+            flight.set(error=error)
+            return
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.loads += 1
+            self.load_time += elapsed
+            self.load_max = max(self.load_max, elapsed)
+            old = self._entries.pop(title, None)
+            if old is not None:
+                self.memory -= old[1]
+            self._entries[title] = (team, size, time.monotonic())
+            self.memory += size
+            self._evict()
+            self._flights.pop(title, None)
+        flight.set(team)
+
+    def _evict(self):
+        """Removes least recently used teams over the limits, called under
+        the lock. The last stored team is kept.
+
+        """
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or
+                self.memory > self.max_memory):
+            _, entry = self._entries.popitem(last=False)
+            self.memory -= entry[1]
+            self.evictions += 1
+
+    def _load_team(self, title):
+        from khl_team.khl import KHLTeam
+
+        return KHLTeam(title, **self._kwargs)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, title):
+        return title in self._entries
+
+    def __str__(self):
+        return '%s(%d teams, hits=%d, misses=%d)' % (
+            self.__class__.__name__, len(self._entries), self.hits,
+            self.misses)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class _Flight(object):
+    """Load of one team awaited by concurrent requests."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._value = None
+        self._error = None
+
+    def set(self, value=None, error=None):
+        self._value = value
+        self._error = error
+        self._event.set()
+
+    def wait(self):
+        self._event.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+def estimate_size(obj, exclude=()):
+    """Estimates the memory taken by the object and the objects it refers to.
+
+    Strings, numbers and containers are counted once, attributes of
+    instances are followed through __dict__ and __slots__.
+
+    :param obj: object;
+    :param exclude: iterable of the shared objects not counted;
+    :return: size in bytes.
+
+    """
+    seen = set(id(item) for item in exclude)
+    stack = [obj]
+    size = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, type):
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif not isinstance(item, (str, bytes, int, float)):
+            if hasattr(item, '__dict__'):
+                stack.append(item.__dict__)
+            for cls in type(item).__mro__:
+                for attr in getattr(cls, '__slots__', ()):
+                    if hasattr(item, attr):
+                        stack.append(getattr(item, attr))
+    return size
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_default():
+    """Gets the team cache shared by the process.
+
+    :return: TeamCache instance.
+
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = TeamCache()
+        return _default
+
+
+def set_default(team_cache):
+    """Replaces the team cache shared by the process.
+
+    :param team_cache: TeamCache instance, None for a new one.
+
+    """
+    global _default
+    with _default_lock:
+        _default = team_cache
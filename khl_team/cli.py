@@ -0,0 +1,304 @@
+"""Command line interface.
+
+This module exports the data of many teams for batch processing: players,
+matches and statistics as JSON Lines or CSV and the upcoming matches as ics
+files. Teams are loaded by a pool of threads, the records of each team are
+written as soon as the team is loaded, so the memory does not grow with the
+number of teams.
+
+Usage:
+
+    khl-team --all --format csv --output export/
+    khl-team Локомотив СКА --records players,ics --output export/
+    khl-team --all --records matches --output - | gzip > matches.jsonl.gz
+
+"""
+
+
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from khl_team.exceptions import TeamNotExistError, TransportError
+from khl_team.khl import KHLEvent, KHLTeam
+from khl_team.parser import KHLParser
+from khl_team.stats import FIELDS, PlayerStats
+from khl_team.transport import HTTPTransport
+
+
+RECORDS = ('players', 'matches', 'stats', 'ics')
+# Columns of the records, also the fields of the JSON objects.
+COLUMNS = {
+    'players': (
+        'team', 'number', 'name', 'role', 'nationality', 'date_birth',
+        'height', 'weight') + PlayerStats._fields,
+    'matches': (
+        'team', 'date', 'time', 'home', 'away', 'home_score', 'away_score',
+        'is_finished', 'winner'),
+    'stats': ('team', 'field', 'title', 'split', 'value', 'avg')
+}
+_SPLITS = ('total', 'home', 'away')
+
+
+def iter_players(team):
+    """Yields the records of the players with the typed statistics."""
+
+    empty = PlayerStats(*[None] * len(PlayerStats._fields))
+    for player in team.players:
+        record = dict((attr, getattr(player, attr))
+                      for attr in COLUMNS['players'][:8])
+        record.update(zip(PlayerStats._fields,
+                          player.stats_record or empty))
+        yield record
+
+
+def iter_matches(team):
+    """Yields the records of the matches of the team."""
+
+    for match in team.matches:
+        score = match.score if len(match.score) == 2 else (None, None)
+        yield {
+            'team': team.team,
+            'date': match.datetime.date().isoformat(),
+            'time': match.datetime.strftime('%H:%M'),
+            'home': match.teams[0],
+            'away': match.teams[1],
+            'home_score': score[0],
+            'away_score': score[1],
+            'is_finished': match.is_finished,
+            'winner': match.winner
+        }
+
+
+def iter_stats(team):
+    """Yields the records of the typed team statistics, one per split."""
+
+    record = team.stats_record
+    for field, title in FIELDS:
+        for split in _SPLITS:
+            value = record.get(field, split)
+            avg = record.get(field, split, avg=True)
+            yield {
+                'team': team.team,
+                'field': field,
+                'title': title,
+                'split': split,
+                'value': None if math.isnan(value) else value,
+                'avg': None if math.isnan(avg) else avg
+            }
+
+
+class Exporter(object):
+    """Writer of the records of the teams."""
+
+    _ITERATORS = {
+        'players': iter_players,
+        'matches': iter_matches,
+        'stats': iter_stats
+    }
+
+    def __init__(self, output, fmt='jsonl', records=RECORDS[:3]):
+        """Initial instance.
+
+        :param output: directory of the files or '-' for stdout (JSON Lines
+        only, each object has the key 'record');
+        :param fmt: jsonl or csv;
+        :param records: kinds of records: players, matches, stats, ics.
+
+        """
+        if fmt not in ('jsonl', 'csv'):
+            raise ValueError('unknown format "%s"' % fmt)
+        if output == '-' and (fmt != 'jsonl' or 'ics' in records):
+            raise ValueError('only jsonl records are written to stdout')
+        unknown = set(records) - set(RECORDS)
+        if unknown:
+            raise ValueError('unknown records %s' % ', '.join(sorted(unknown)))
+        self.output = output
+        self.fmt = fmt
+        self.records = tuple(records)
+        self.teams = 0
+        self.rows = 0
+        self.bytes = 0
+        self._ics_bytes = 0
+        self._files = {}
+        self._writers = {}
+        if output != '-':
+            os.makedirs(output, exist_ok=True)
+
+    def write(self, team):
+        """Writes the records of the team and flushes the files.
+
+        :param team: KHLTeam instance.
+
+        """
+        for kind in self.records:
+            if kind == 'ics':
+                self._write_ics(team)
+                continue
+            write = self._get_writer(kind)
+            for record in Exporter._ITERATORS[kind](team):
+                write(record)
+                self.rows += 1
+        for file_ in self._files.values():
+            file_.flush()
+        if self.output != '-':
+            self.bytes = self._ics_bytes + sum(
+                file_.tell() for file_ in self._files.values())
+        self.teams += 1
+
+    def close(self):
+        for file_ in self._files.values():
+            if file_ is not sys.stdout:
+                file_.close()
+        self._files.clear()
+        self._writers.clear()
+
+    def _get_writer(self, kind):
+        """Gets the callable(record) writing the records of the kind."""
+
+        if kind in self._writers:
+            return self._writers[kind]
+        if self.output == '-':
+            file_ = self._files['-'] = sys.stdout
+        else:
+            file_ = self._files[kind] = open(
+                os.path.join(self.output, '%s.%s' % (kind, self.fmt)), 'w',
+                encoding='UTF-8', newline='')
+        if self.fmt == 'csv':
+            csv_writer = csv.DictWriter(file_, COLUMNS[kind])
+            csv_writer.writeheader()
+
+            def write(record):
+                csv_writer.writerow(record)
+        elif self.output == '-':
+            def write(record):
+                line = json.dumps(dict(record=kind, **record),
+                                  ensure_ascii=False) + '\n'
+                file_.write(line)
+                self.bytes += len(line.encode('utf-8'))
+        else:
+            def write(record):
+                file_.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+        self._writers[kind] = write
+        return write
+
+    def _write_ics(self, team):
+        """Writes the upcoming matches of the team to '<team>.ics'."""
+
+        ics = KHLEvent.gen_ics(team.find_matches(finished=False))
+        with open(os.path.join(self.output, '%s.ics' % team.team),
+                  'wb') as file_:
+            file_.write(ics)
+        self._ics_bytes += len(ics)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __str__(self):
+        return '%s(%s, teams=%d, rows=%d)' % (
+            self.__class__.__name__, self.output, self.teams, self.rows)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def iter_teams(titles, index, workers=4, **kwargs):
+    """Loads the teams concurrently, yields them in the order of loading.
+
+    At most twice workers teams are loaded or wait for the consumer, so the
+    memory does not depend on the number of teams.
+
+    :param titles: iterable of team titles;
+    :param index: teams index of KHLParser;
+    :param workers: number of threads;
+    :param kwargs: keyword arguments of KHLParser;
+    :return: generator of KHLTeam instance.
+
+    """
+    def load(title):
+        return KHLTeam.from_data(
+            KHLParser(title, teams=index, **kwargs).get_data(), **kwargs)
+
+    titles = iter(titles)
+    with ThreadPoolExecutor(workers) as executor:
+        pending = set()
+        try:
+            while True:
+                for title in titles:
+                    pending.add(executor.submit(load, title))
+                    if len(pending) >= 2 * workers:
+                        break
+                if not pending:
+                    return
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        prog='khl-team', description='Exports the data of the KHL teams.')
+    arg_parser.add_argument('teams', nargs='*', help='team titles')
+    arg_parser.add_argument('--all', action='store_true',
+                            help='all teams of the teams index')
+    arg_parser.add_argument('--format', choices=('jsonl', 'csv'),
+                            default='jsonl')
+    arg_parser.add_argument('--records', default='players,matches,stats',
+                            help='comma-separated: %s' % ', '.join(RECORDS))
+    arg_parser.add_argument('--output', default='.',
+                            help='directory of the files, - for stdout')
+    arg_parser.add_argument('--workers', type=int, default=4,
+                            help='threads loading the teams')
+    arg_parser.add_argument('--base-url', default=None,
+                            help='URL of the site or of its mirror')
+    arg_parser.add_argument('--rate', type=float, default=None,
+                            help='requests per second to one host, by '
+                                 'default unlimited')
+    arg_parser.add_argument('--burst', type=int, default=1,
+                            help='requests sent without waiting for the '
+                                 'rate')
+    args = arg_parser.parse_args(argv)
+    if not args.teams and not args.all:
+        arg_parser.error('give the team titles or --all')
+
+    start = time.perf_counter()
+    with HTTPTransport(rate=args.rate, burst=args.burst) as transport:
+        kwargs = {'base_url': args.base_url, 'transport': transport}
+        try:
+            index = KHLParser(**kwargs).teams_index
+            titles = list(index) if args.all else args.teams
+            for title in titles:
+                if title not in index:
+                    raise TeamNotExistError(title)
+            with Exporter(args.output, args.format,
+                          args.records.split(',')) as exporter:
+                for team in iter_teams(titles, index, args.workers,
+                                       **kwargs):
+                    exporter.write(team)
+        except (ValueError, TeamNotExistError, TransportError) as error:
+            print('khl-team: %s' % str(error).strip("'"), file=sys.stderr)
+            return 2
+    elapsed = time.perf_counter() - start
+    print('%d teams, %d records, %d bytes in %.2fs: %.1f teams/s, '
+          '%.0f records/s' % (
+              exporter.teams, exporter.rows, exporter.bytes, elapsed,
+              exporter.teams / elapsed, exporter.rows / elapsed),
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
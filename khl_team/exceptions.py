@@ -22,3 +22,11 @@ class PlayerNotExistError(Exception):
 
 class MatchNotExistError(Exception):
     pass
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class TransportError(Exception):
+    pass
@@ -0,0 +1,338 @@
+"""Instrument module.
+
+This module measures the stages of the team load: fetch and parse of each
+page, each extractor of KHLParser, construction of the entities and
+generation of the ics file. Each measurement reports the duration, the
+number of bytes and of rows, it is passed to the hooks and aggregated by
+the stats registry, which is exported in Prometheus text format or JSON.
+
+Usage:
+
+    from khl_team import instrument
+
+    instrument.get_default().add_hook(print)
+    team = KHLTeam('СКА')
+    print(instrument.get_default().to_prometheus())
+
+"""
+
+
+import contextlib
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class Measurement(object):
+    """Measurement of one stage."""
+
+    __slots__ = ('stage', 'name', 'duration', 'bytes', 'rows', 'error',
+                 'nested')
+
+    def __init__(self, stage, name):
+        """Initial instance.
+
+        :param stage: fetch, parse, extract, build or ics;
+        :param name: kind of page, extractor or entity.
+
+        """
+        self.stage = stage
+        self.name = name
+        self.duration = 0.0
+        self.bytes = 0
+        self.rows = 0
+        self.error = None
+        self.nested = 0.0
+
+    def to_dict(self):
+        return dict((attr, getattr(self, attr))
+                    for attr in Measurement.__slots__[:6])
+
+    def __str__(self):
+        return '%s(%s.%s, %.6fs, %d bytes, %d rows)' % (
+            self.__class__.__name__, self.stage, self.name, self.duration,
+            self.bytes, self.rows)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class StageStats(object):
+    """Aggregated measurements of one stage and name."""
+
+    __slots__ = ('count', 'errors', 'total', 'max', 'bytes', 'rows')
+
+    def __init__(self):
+        """Initial instance."""
+
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.bytes = 0
+        self.rows = 0
+
+    def add(self, measurement):
+        """Adds the measurement.
+
+        :param measurement: Measurement instance.
+
+        """
+        self.count += 1
+        self.errors += measurement.error is not None
+        self.total += measurement.duration
+        self.max = max(self.max, measurement.duration)
+        self.bytes += measurement.bytes
+        self.rows += measurement.rows
+
+    def to_dict(self):
+        stats = dict((attr, getattr(self, attr))
+                     for attr in StageStats.__slots__)
+        stats['avg'] = self.total / self.count if self.count else 0.0
+        return stats
+
+    def __str__(self):
+        return '%s(count=%d, total=%.6f)' % (
+            self.__class__.__name__, self.count, self.total)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class Instrument(object):
+    """Hooks and stats registry of the stages."""
+
+    _PREFIX = 'khl_team_stage'
+    # Prometheus metrics: name, type, help and the samples (suffix,
+    # attribute of StageStats).
+    _METRICS = (
+        ('seconds', 'summary', 'Duration of the stage in seconds.',
+         (('_count', 'count'), ('_sum', 'total'))),
+        ('seconds_max', 'gauge', 'Max duration of the stage in seconds.',
+         (('', 'max'),)),
+        ('errors_total', 'counter', 'Number of the failed stage runs.',
+         (('', 'errors'),)),
+        ('bytes_total', 'counter', 'Bytes processed by the stage.',
+         (('', 'bytes'),)),
+        ('rows_total', 'counter', 'Rows produced by the stage.',
+         (('', 'rows'),))
+    )
+
+    def __init__(self):
+        """Initial instance."""
+
+        self._hooks = []
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def add_hook(self, hook):
+        """Adds the callback called after each stage.
+
+        :param hook: callable(measurement), errors of the hook are logged.
+
+        """
+        with self._lock:
+            self._hooks = self._hooks + [hook]
+
+    def remove_hook(self, hook):
+        """Removes the callback.
+
+        :param hook: callable added by add_hook.
+
+        """
+        with self._lock:
+            self._hooks = [item for item in self._hooks if item is not hook]
+
+    @contextlib.contextmanager
+    def measure(self, stage, name):
+        """Measures the stage.
+
+        The yielded measurement takes the bytes and the rows of the stage,
+        the duration is set on exit. The duration excludes the stages
+        measured inside the block of the same thread, e.g. the extractor
+        does not include the fetch and the parse of its page.
+
+        :param stage: fetch, parse, extract, build or ics;
+        :param name: kind of page, extractor or entity;
+        :return: context manager yielding Measurement instance.
+
+        """
+        measurement = Measurement(stage, name)
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(measurement)
+        start = time.perf_counter()
+        try:
+            yield measurement
+        except BaseException as error:
+            measurement.error = error
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if stack:
+                stack[-1].nested += elapsed
+            measurement.duration = elapsed - measurement.nested
+            self.add(measurement)
+
+    @contextlib.asynccontextmanager
+    async def ameasure(self, stage, name):
+        """Measures the stage of the coroutine.
+
+        Coroutines of one thread interleave, so the duration is the wall
+        time of the block including the nested stages.
+
+        :param stage: fetch, parse, extract, build or ics;
+        :param name: kind of page, extractor or entity;
+        :return: async context manager yielding Measurement instance.
+
+        """
+        measurement = Measurement(stage, name)
+        start = time.perf_counter()
+        try:
+            yield measurement
+        except BaseException as error:
+            measurement.error = error
+            raise
+        finally:
+            measurement.duration = time.perf_counter() - start
+            self.add(measurement)
+
+    def add(self, measurement):
+        """Aggregates the measurement and passes it to the hooks.
+
+        :param measurement: Measurement instance.
+
+        """
+        key = (measurement.stage, measurement.name)
+        with self._lock:
+            if key not in self._stats:
+                self._stats[key] = StageStats()
+            self._stats[key].add(measurement)
+            hooks = self._hooks
+        for hook in hooks:
+            try:
+                hook(measurement)
+            except Exception:
+                logger.exception('hook %r failed', hook)
+
+    def get(self, stage, name):
+        """Gets the aggregated stats.
+
+        :param stage: stage;
+        :param name: kind of page, extractor or entity;
+        :return: StageStats instance or None.
+
+        """
+        return self._stats.get((stage, name))
+
+    def reset(self):
+        """Drops the aggregated stats, the hooks are kept."""
+
+        with self._lock:
+            self._stats = {}
+
+    def to_dict(self):
+        """Exports the stats.
+
+        :return: dict (key - stage, value - dict (key - name, value - dict
+        of StageStats)).
+
+        """
+        with self._lock:
+            items = sorted(self._stats.items())
+        stats = {}
+        for (stage, name), stage_stats in items:
+            stats.setdefault(stage, {})[name] = stage_stats.to_dict()
+        return stats
+
+    def to_json(self, **kwargs):
+        """Exports the stats in JSON.
+
+        :param kwargs: keyword arguments of json.dumps;
+        :return: string.
+
+        """
+        import json
+
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def to_prometheus(self):
+        """Exports the stats in Prometheus text format.
+
+        :return: string.
+
+        """
+        with self._lock:
+            items = sorted(self._stats.items())
+        lines = []
+        for metric, metric_type, help_text, samples in Instrument._METRICS:
+            metric = '%s_%s' % (Instrument._PREFIX, metric)
+            lines.append('# HELP %s %s' % (metric, help_text))
+            lines.append('# TYPE %s %s' % (metric, metric_type))
+            for (stage, name), stage_stats in items:
+                for suffix, attr in samples:
+                    lines.append('%s%s{stage="%s",name="%s"} %s' % (
+                        metric, suffix, _escape(stage), _escape(name),
+                        repr(getattr(stage_stats, attr))))
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    @contextlib.contextmanager
+    def profile(path=None):
+        """Captures cProfile stats of the block.
+
+        :param path: file path to dump the stats, by default not saved;
+        :return: context manager yielding cProfile.Profile instance, use
+        pstats.Stats(profile) after the block.
+
+        """
+        import cProfile
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield profile
+        finally:
+            profile.disable()
+            if path:
+                profile.dump_stats(path)
+
+    def __str__(self):
+        return '%s(%d stages, %d hooks)' % (
+            self.__class__.__name__, len(self._stats), len(self._hooks))
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def _escape(value):
+    """Escapes the label value of Prometheus text format."""
+
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n')
+
+
+_default = Instrument()
+
+
+def get_default():
+    """Gets the instrument shared by the parsers and the entities.
+
+    :return: Instrument instance.
+
+    """
+    return _default
+
+
+def set_default(instrument):
+    """Replaces the instrument shared by the parsers and the entities.
+
+    :param instrument: Instrument instance.
+
+    """
+    global _default
+    _default = instrument
@@ -7,12 +7,40 @@ and parameters statistics are displayed in Russian language only.
 """
 
 
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
 from datetime import datetime, timedelta
+from functools import lru_cache
 
-from icalendar import Alarm, Calendar, Event
+from khl_team import instrument as instruments
+from khl_team import snapshot
+from khl_team.players import PlayerIndex, split_name
+from khl_team.stats import FIELDS, TeamStats, parse_player_stats, rank
+from khl_team.store import MatchStore
+from khl_team.exceptions import (
+    PlayerNotExistError,
+    MatchNotExistError,
+    TeamNotExistError
+)
 
-from khl_team.parser import KHLParser
-from khl_team.exceptions import PlayerNotExistError, MatchNotExistError
+
+class RefreshDiff(namedtuple('RefreshDiff', (
+        'results', 'new_matches', 'removed_matches', 'players_added',
+        'players_removed', 'meta', 'stats'))):
+    """Changes of the team found by the refresh.
+
+    results - matches with a new score, new_matches/removed_matches - lists
+    of KHLEvent; players_added/players_removed - lists of KHLPlayer; meta -
+    dict (key - attribute, value - tuple(old, new)); stats - dict (key -
+    field of khl_team.stats.FIELDS, value - delta of the total value or None
+    if the value appeared or disappeared).
+
+    """
+
+    __slots__ = ()
+
+    def __bool__(self):
+        return any(self)
 
 
 class KHLTeam(object):
@@ -23,8 +51,31 @@ class KHLTeam(object):
         'sponsor', 'stats', 'president',
         'head_coach'
     )
+    _ATTR_META = ('head_coach', 'arena', 'president', 'sponsor', 'site')
+    # Attributes loaded on the first access in the lazy mode and their pages.
+    _ATTR_PAGES = {
+        'matches': 'matches',
+        '_match_index': 'matches',
+        '_match_order': 'matches',
+        '_match_dates': 'matches',
+        'head_coach': 'matches',
+        'arena': 'matches',
+        'president': 'matches',
+        'sponsor': 'matches',
+        'site': 'matches',
+        'players': 'players',
+        '_player_index': 'players',
+        'stats': 't_stats',
+        'stats_record': 't_stats'
+    }
+    _SECTION_PAGES = {
+        'matches': 'matches',
+        'meta': 'matches',
+        'players': 'players',
+        'stats': 't_stats'
+    }
 
-    def __init__(self, team):
+    def __init__(self, team, lazy=False, **kwargs):
         """Initial instance.
 
         :param team: team title, can take the following values:
@@ -32,9 +83,19 @@ class KHLTeam(object):
         Динамо М, Динамо Мн, Динамо Р, Йокерит, Куньлунь Ред Стар, Лада,
         Локомотив, Медвешчак, Металлург Мг, Металлург Нк, Нефтехимик,
         Салават Юлаев, Северсталь, Сибирь, СКА, Слован, Спартак, Торпедо,
-        Трактор, ХК Сочи, ЦСКА, Югра.
+        Трактор, ХК Сочи, ЦСКА, Югра;
+        :param lazy: only the teams index is parsed, sections (matches,
+        meta, players, stats) are loaded on the first access;
+        :param kwargs: keyword arguments of KHLParser (cache, rate, burst).
 
         """
+        self._kwargs = kwargs
+        if lazy:
+            try:
+                self._set_entry(_parser(**kwargs).teams_index[team])
+            except KeyError:
+                raise TeamNotExistError(team)
+            return
         self.site = None
         self.arena = None
         self.location = None
@@ -43,15 +104,272 @@ class KHLTeam(object):
         self.stats = None
         self.president = None
         self.head_coach = None
-        team_data = KHLParser(team).get_data()
-        players = team_data['players']
-        for attr in KHLTeam._ATTR_INIT:
-            setattr(self, attr, team_data[attr])
-        self.players = [KHLPlayer(**players[player]) for player in players]
-        self.matches = list(
-            map(lambda match: KHLEvent(**match), team_data['matches'])
+        self._set_data(_parser(team, **kwargs).get_data())
+
+    @classmethod
+    def from_data(cls, team_data, **kwargs):
+        """Creates instance from the parsed data without fetching pages.
+
+        :param team_data: team dict of KHLParser.get_data;
+        :param kwargs: keyword arguments of KHLParser for the refresh;
+        :return: KHLTeam instance.
+
+        """
+        team = cls.__new__(cls)
+        team._kwargs = kwargs
+        team._set_data(team_data)
+        return team
+
+    @classmethod
+    def from_index(cls, entry, **kwargs):
+        """Creates lazy instance from the teams index entry.
+
+        :param entry: dict with keys: team, location, urls (see
+        KHLParser.teams_index);
+        :param kwargs: keyword arguments of KHLParser;
+        :return: KHLTeam instance.
+
+        """
+        team = cls.__new__(cls)
+        team._kwargs = kwargs
+        team._set_entry(entry)
+        return team
+
+    @classmethod
+    async def aload(cls, team, timeout=None, **kwargs):
+        """Loads instance without blocking the event loop.
+
+        :param team: team title (see __init__);
+        :param timeout: seconds of the load, by default unlimited;
+        :param kwargs: keyword arguments of KHLParser;
+        :return: KHLTeam instance.
+
+        """
+        return cls.from_data(
+            await _parser(team, **kwargs).aget_data(timeout=timeout),
+            **kwargs
         )
 
+    @classmethod
+    def from_snapshot(cls, path, team=None):
+        """Loads instance from the snapshot file.
+
+        :param path: file path;
+        :param team: team title, by default the first team of the file;
+        :return: KHLTeam instance.
+
+        """
+        with snapshot.Snapshot(path) as snap:
+            return cls.from_data(snap.get(team if team else snap.teams[0]))
+
+    def to_snapshot(self, path):
+        """Saves instance to the snapshot file.
+
+        :param path: file path.
+
+        """
+        snapshot.save(path, [self.to_data()])
+
+    def to_data(self):
+        """Converts instance to the team dict of KHLParser.get_data.
+
+        :return: dict.
+
+        """
+        team_data = dict(
+            (attr, getattr(self, attr)) for attr in KHLTeam._ATTR_INIT)
+        team_data['urls'] = self.urls
+        team_data['digests'] = self.digests
+        team_data['players'] = dict(
+            (player.number, player.to_data()) for player in self.players)
+        team_data['matches'] = [match.to_data() for match in self.matches]
+        return team_data
+
+    def prefetch(self, *sections):
+        """Loads the sections not loaded yet in one run of the parser.
+
+        :param sections: matches, meta, players, stats; by default all
+        sections.
+
+        """
+        self._load(KHLTeam._get_section_pages(sections))
+
+    def _load(self, pages):
+        """Loads the pages not loaded yet.
+
+        :param pages: kinds of pages (keys of KHLParser._URL).
+
+        """
+        pages = set(pages) - self._loaded
+        if pages:
+            self._set_sections(self._get_parser().get_data(pages=pages))
+
+    def _set_entry(self, entry):
+        """Sets attributes from the teams index entry.
+
+        :param entry: dict with keys: team, location, urls.
+
+        """
+        self.team = entry['team']
+        self.location = entry['location']
+        self.urls = entry.get('urls')
+        self.digests = {}
+        self._loaded = set()
+
+    def _set_data(self, team_data):
+        """Sets attributes from the team dict.
+
+        :param team_data: team dict of KHLParser.get_data.
+
+        """
+        self._set_entry(team_data)
+        self._set_sections(team_data)
+
+    def _set_sections(self, team_data):
+        """Sets the sections present in the team dict.
+
+        :param team_data: team dict of KHLParser.get_data.
+
+        """
+        if 'matches' in team_data:
+            for attr in KHLTeam._ATTR_META:
+                setattr(self, attr, team_data.get(attr))
+            self.matches = KHLEvent.from_rows(
+                team_data['matches'], self._kwargs.get('instrument'))
+            self._build_match_index()
+            self._loaded.add('matches')
+        if 'players' in team_data:
+            self.players = KHLPlayer.from_rows(
+                team_data['players'].values(), self._kwargs.get('instrument'))
+            self._build_player_index()
+            self._loaded.update(('players', 'p_stats'))
+        if 'stats' in team_data:
+            self.stats = team_data['stats']
+            self.stats_record = TeamStats(self.team, self.stats)
+            self._loaded.add('t_stats')
+        self.digests.update(team_data.get('digests', {}))
+
+    def _get_parser(self, **kwargs):
+        """Creates the parser of the team without the teams index fetch.
+
+        :param kwargs: keyword arguments of KHLParser, by default the
+        arguments of the initial load;
+        :return: KHLParser instance.
+
+        """
+        return _parser(self.team, teams={self.team: self._index_entry()},
+                       **(kwargs if kwargs else self._kwargs))
+
+    @staticmethod
+    def _get_section_pages(sections):
+        """Gets the pages of the sections.
+
+        :param sections: matches, meta, players, stats; empty for all;
+        :return: set of the kinds of pages.
+
+        """
+        try:
+            return set(KHLTeam._SECTION_PAGES[section] for section in (
+                sections if sections else KHLTeam._SECTION_PAGES))
+        except KeyError as error:
+            raise ValueError('unknown section %s' % error)
+
+    def refresh(self, **kwargs):
+        """Updates the sections of the changed pages.
+
+        All pages are fetched, but only the pages with the changed content
+        are extracted again. Matches are updated in place.
+
+        :param kwargs: keyword arguments of KHLParser, by default the
+        arguments of the initial load;
+        :return: RefreshDiff instance.
+
+        """
+        return self.update(self._get_parser(**kwargs).get_data(
+            digests={self.team: self.digests}, pages=self._loaded))
+
+    async def arefresh(self, timeout=None, **kwargs):
+        """Updates the changed pages without blocking the event loop.
+
+        :param timeout: seconds of the refresh, by default unlimited;
+        :param kwargs: see refresh;
+        :return: RefreshDiff instance.
+
+        """
+        return self.update(await self._get_parser(**kwargs).aget_data(
+            digests={self.team: self.digests}, pages=self._loaded,
+            timeout=timeout))
+
+    def update(self, team_data):
+        """Applies the team dict of a partial run of KHLParser.get_data.
+
+        :param team_data: team dict, sections missing in the dict are not
+        changed;
+        :return: RefreshDiff instance.
+
+        """
+        results, new_matches, removed_matches = [], [], []
+        if 'matches' in team_data:
+            events = dict(
+                ((match.datetime, match.teams), match)
+                for match in self.matches
+            )
+            matches = []
+            new_events = KHLEvent.from_rows(
+                team_data['matches'], self._kwargs.get('instrument'))
+            for match in new_events:
+                event = events.pop((match.datetime, match.teams), None)
+                if event is None:
+                    event = match
+                    new_matches.append(match)
+                elif event.score != match.score:
+                    event.update(match.score)
+                    results.append(event)
+                matches.append(event)
+            removed_matches = list(events.values())
+            self.matches = matches
+            self._build_match_index()
+        meta = {}
+        for attr in KHLTeam._ATTR_META:
+            if attr in team_data and getattr(self, attr) != team_data[attr]:
+                meta[attr] = (getattr(self, attr), team_data[attr])
+                setattr(self, attr, team_data[attr])
+        players_added, players_removed = [], []
+        if 'players' in team_data:
+            old_players = dict(
+                (player.number, player) for player in self.players)
+            players = team_data['players']
+            self.players = KHLPlayer.from_rows(
+                players.values(), self._kwargs.get('instrument'))
+            players_added = [player for player in self.players
+                             if player.number not in old_players]
+            players_removed = [player for number, player in old_players.items()
+                               if number not in players]
+            self._build_player_index()
+        stats = {}
+        if 'stats' in team_data:
+            record = TeamStats(self.team, team_data['stats'])
+            for field, _ in FIELDS:
+                old, new = self.stats_record.get(field), record.get(field)
+                if old != new and (old == old or new == new):
+                    # NaN is a missing value, it has no delta.
+                    stats[field] = new - old if old == old and new == new \
+                        else None
+            self.stats = team_data['stats']
+            self.stats_record = record
+        self.digests.update(team_data.get('digests', {}))
+        return RefreshDiff(results, new_matches, removed_matches,
+                           players_added, players_removed, meta, stats)
+
+    def _index_entry(self):
+        """Creates the teams index entry of the team.
+
+        :return: dict with keys: team, location, urls.
+
+        """
+        return {'team': self.team, 'location': self.location,
+                'urls': self.urls}
+
     def get_player(self, number=None, l_name=None, role=None):
         """Gets the list of players.
 
@@ -69,11 +387,7 @@ class KHLTeam(object):
             attr, val = 'role', role
         else:
             return self.players
-        return self._filter_player(attr=attr, attr_val=val)
-
-    def _filter_player(self, attr=None, attr_val=None):
-        player_list = list(filter(
-            lambda player: attr_val == getattr(player, attr), self.players))
+        player_list = self.find_players(**{attr: val})
         if player_list:
             return player_list
         else:
@@ -88,65 +402,142 @@ class KHLTeam(object):
         :return: list of KHLEvent instance.
 
         """
-        match_list = self._get_not_played_match() if not played \
-            else self.matches.copy()
-        if opponent:
-            match_list = self._get_opponent_match(opponent, match_list)
-        if result:
-            match_list = self._get_result_match(result, match_list)
+        match_list = self.find_matches(
+            opponent=opponent if opponent else None,
+            result=result if result else None,
+            finished=None if played else False
+        )
         if match_list:
             return match_list
         else:
             raise MatchNotExistError
 
-    def _get_not_played_match(self):
-        """Gets a list of upcoming matches.
+    def find_players(self, number=None, l_name=None, role=None, limit=None):
+        """Finds players by the indexes, all given filters are combined.
 
-        :return: list of KHLEvent instance.
+        :param number: player number;
+        :param l_name: last name;
+        :param role: player role;
+        :param limit: max number of players;
+        :return: list of KHLPlayer instance (empty if nothing found).
 
         """
-        return list(
-            filter(lambda match: False is match.is_finished, self.matches)
+        filters = [(attr, val) for attr, val in (
+            ('number', number), ('l_name', l_name), ('role', role)
+        ) if val is not None]
+        if not filters:
+            return self.players[:limit]
+        candidates = min(
+            (self._player_index[attr].get(val, ()) for attr, val in filters),
+            key=len
         )
+        player_list = [
+            player for player in candidates
+            if all(getattr(player, attr) == val for attr, val in filters)
+        ]
+        return player_list[:limit]
 
-    @staticmethod
-    def _get_opponent_match(opponent, match_list):
-        """Gets a list of matches with a certain team.
+    def find_matches(self, opponent=None, result=None, finished=None,
+                     home=None, since=None, until=None, limit=None):
+        """Finds matches by the indexes, all given filters are combined.
 
         :param opponent: team title;
-        :param match_list: list of KHLEvent instance;
-        :return: list of KHLEvent instance.
+        :param result: won/lose;
+        :param finished: True - only played, False - only upcoming;
+        :param home: True - only home matches, False - only away;
+        :param since: datetime, start of the date range (inclusive);
+        :param until: datetime, end of the date range (inclusive);
+        :param limit: max number of matches;
+        :return: list of KHLEvent instance in the order of matches (empty if
+        nothing found).
+
+        """
+        candidates = [
+            self._match_index[attr].get(val, frozenset())
+            for attr, val in (
+                ('opponent', opponent), ('result', result),
+                ('home', home)
+            ) if val is not None
+        ]
+        if finished is not None:
+            # The status depends on the current time, so it is not indexed.
+            pos = bisect_left(self._match_dates, datetime.today())
+            candidates.append(frozenset(
+                self._match_order[:pos] if finished
+                else self._match_order[pos:]))
+        if since is not None or until is not None:
+            low = bisect_left(self._match_dates, since) \
+                if since is not None else 0
+            high = bisect_right(self._match_dates, until) \
+                if until is not None else len(self._match_dates)
+            candidates.append(frozenset(self._match_order[low:high]))
+        if not candidates:
+            return self.matches[:limit]
+        candidates.sort(key=len)
+        positions = sorted(candidates[0].intersection(*candidates[1:]))
+        return [self.matches[pos] for pos in positions[:limit]]
+
+    def _build_player_index(self):
+        """Builds the indexes of players by number, last name and role."""
+
+        self._player_index = {'number': {}, 'l_name': {}, 'role': {}}
+        for player in self.players:
+            for attr, index in self._player_index.items():
+                index.setdefault(getattr(player, attr), []).append(player)
+
+    def _build_match_index(self):
+        """Builds the indexes of matches.
+
+        Matches are indexed by opponent, result and home/away as sets of the
+        positions in the matches list, the date-sorted positions are used for
+        the date range and the status.
 
         """
-        return list(
-            filter(lambda match: opponent in match.teams, match_list)
+        self._match_index = {
+            'opponent': {}, 'result': {}, 'home': {}
+        }
+        for pos, match in enumerate(self.matches):
+            for attr, val in (
+                ('opponent', match.teams[0]), ('opponent', match.teams[1]),
+                ('result', self._get_result(match)),
+                ('home', match.teams[0] == self.team)
+            ):
+                if val is not None:
+                    self._match_index[attr].setdefault(val, set()).add(pos)
+        for index in self._match_index.values():
+            for val in index:
+                index[val] = frozenset(index[val])
+        self._match_order = sorted(
+            range(len(self.matches)),
+            key=lambda pos: self.matches[pos].datetime
         )
+        self._match_dates = [
+            self.matches[pos].datetime for pos in self._match_order
+        ]
 
-    def _get_result_match(self, result, match_list):
-        """Gets a list of matches with a specific result.
+    def _get_result(self, match):
+        """Gets the result of the match for the team.
 
-        :param result: won/lose;
-        :param match_list: list of KHLEvent instance;
-        :return: list of KHLEvent instance.
+        :param match: KHLEvent instance;
+        :return: won/lose or None.
 
         """
-        result_list = []
-        if result == 'won':
-            result_list = list(
-                filter(lambda match: self.team == match.winner, match_list)
-            )
-        elif result == 'lose':
-            result_list = list(
-                filter(lambda match: self._lose_check(match), match_list)
-            )
-        if result_list:
-            return result_list
-        else:
-            raise MatchNotExistError
+        if match.winner is None:
+            return None
+        return 'won' if self.team == match.winner else 'lose'
+
+    def __getattr__(self, attr):
+        """Loads the section of the attribute on the first access.
+
+        Only the attributes of the sections not loaded yet (lazy mode) get
+        here, other missing attributes raise AttributeError.
 
-    def _lose_check(self, match):
-        if self.team != match.winner and match.winner is not None:
-            return match
+        """
+        page = KHLTeam._ATTR_PAGES.get(attr)
+        if page is None or page in self.__dict__.get('_loaded', (page,)):
+            raise AttributeError(attr)
+        self._load((page,))
+        return self.__dict__[attr]
 
     def __str__(self):
         return '%s(%s, %s)' % (
@@ -156,9 +547,391 @@ class KHLTeam(object):
         return self.__str__()
 
 
+class KHLLeague(object):
+    """League class.
+
+    The teams index is parsed once and shared by all loaded teams.
+
+    """
+
+    def __init__(self, *teams, lazy=False, **kwargs):
+        """Initial instance.
+
+        :param teams: the sequence of title teams, by default all teams of
+        the index are loaded;
+        :param lazy: sections of the teams are loaded on the first access
+        (see KHLTeam);
+        :param kwargs: keyword arguments of KHLParser (cache, workers,
+        host_limit, rate, burst).
+
+        """
+        self._kwargs = kwargs
+        self._lazy = lazy
+        self._match_store = None
+        self._player_index = None
+        self.index = _parser(**kwargs).teams_index
+        self.teams = {}
+        self.load(*(teams if teams else self.index))
+
+    def load(self, *teams):
+        """Loads the teams from the shared index.
+
+        :param teams: the sequence of title teams;
+        :return: list of KHLTeam instance.
+
+        """
+        if self._lazy:
+            for team in teams:
+                if team not in self.index:
+                    raise TeamNotExistError(team)
+                self.teams[team] = KHLTeam.from_index(
+                    self.index[team], **self._kwargs)
+        else:
+            data = _parser(*teams, teams=self.index,
+                           **self._kwargs).get_data()
+            for team_data in data if isinstance(data, list) else [data]:
+                self.teams[team_data['team']] = KHLTeam.from_data(
+                    team_data, **self._kwargs)
+        self._changed(teams)
+        return [self.teams[team] for team in teams]
+
+    def prefetch(self, *sections, teams=()):
+        """Loads the sections not loaded yet of the lazy teams.
+
+        Teams missing the same pages are loaded in one run of the parser.
+
+        :param sections: matches, meta, players, stats; by default all
+        sections;
+        :param teams: the sequence of title teams, by default all loaded
+        teams.
+
+        """
+        pages = KHLTeam._get_section_pages(sections)
+        groups = {}
+        for team in self._get_teams(teams):
+            missing = frozenset(pages - team._loaded)
+            if missing:
+                groups.setdefault(missing, []).append(team)
+        for missing, group in groups.items():
+            for team_data in self._get_data(group, pages=missing):
+                self.teams[team_data['team']]._set_sections(team_data)
+        self._changed(team.team for group in groups.values()
+                      for team in group)
+
+    def refresh(self, *teams):
+        """Updates the changed pages of the loaded teams.
+
+        Only the loaded sections of the lazy teams are refreshed.
+
+        :param teams: the sequence of title teams, by default all loaded
+        teams;
+        :return: dict (key - team title, value - RefreshDiff instance).
+
+        """
+        return self.apply(self.fetch(*teams))
+
+    def fetch(self, *teams):
+        """Parses the changed pages of the loaded teams without applying.
+
+        The loaded teams are not changed, so they can be read while the
+        pages are fetched, the result is applied by apply.
+
+        :param teams: the sequence of title teams, by default all loaded
+        teams;
+        :return: list of the team dicts.
+
+        """
+        data = []
+        for pages, group in self._group_loaded(teams).items():
+            data.extend(self._get_data(
+                group, pages=pages, digests=KHLLeague._get_digests(group)))
+        return data
+
+    def apply(self, data):
+        """Applies the fetched team dicts to the loaded teams.
+
+        :param data: list of the team dicts of fetch;
+        :return: dict (key - team title, value - RefreshDiff instance).
+
+        """
+        return self._update(data)
+
+    @classmethod
+    async def aload(cls, *teams, timeout=None, **kwargs):
+        """Loads instance without blocking the event loop.
+
+        :param teams: the sequence of title teams, by default all teams of
+        the index are loaded;
+        :param timeout: seconds of the load, by default unlimited;
+        :param kwargs: keyword arguments of KHLParser;
+        :return: KHLLeague instance.
+
+        """
+        league = cls.__new__(cls)
+        league._kwargs = kwargs
+        league._lazy = False
+        league._match_store = None
+        league._player_index = None
+        league.teams = {}
+        parser = _parser(*teams, **kwargs)
+
+        async def load():
+            league.index = await parser.ateams_index()
+            if not teams:
+                parser.team = tuple(league.index)
+            return await parser.aget_data()
+
+        import asyncio
+
+        data = await asyncio.wait_for(load(), timeout)
+        for team_data in data if isinstance(data, list) else [data]:
+            league.teams[team_data['team']] = KHLTeam.from_data(
+                team_data, **kwargs)
+        return league
+
+    async def arefresh(self, *teams, timeout=None):
+        """Updates the changed pages without blocking the event loop.
+
+        :param teams: see refresh;
+        :param timeout: seconds of the refresh, by default unlimited;
+        :return: dict (key - team title, value - RefreshDiff instance).
+
+        """
+        import asyncio
+
+        groups = self._group_loaded(teams)
+        results = await asyncio.wait_for(asyncio.gather(*(
+            self._get_parser(group).aget_data(
+                pages=pages, digests=KHLLeague._get_digests(group))
+            for pages, group in groups.items()
+        )), timeout)
+        diffs = {}
+        for data in results:
+            diffs.update(self._update(data if isinstance(data, list)
+                                      else [data]))
+        return diffs
+
+    def _group_loaded(self, teams=()):
+        """Groups the teams by the loaded pages.
+
+        :param teams: the sequence of title teams, by default all loaded
+        teams;
+        :return: dict (key - frozenset of the pages, value - list of KHLTeam
+        instance).
+
+        """
+        groups = {}
+        for team in self._get_teams(teams):
+            groups.setdefault(frozenset(team._loaded), []).append(team)
+        return groups
+
+    def _update(self, data):
+        """Applies the refreshed team dicts.
+
+        :param data: list of the team dicts;
+        :return: dict (key - team title, value - RefreshDiff instance).
+
+        """
+        diffs = dict((team_data['team'],
+                      self.teams[team_data['team']].update(team_data))
+                     for team_data in data)
+        # The players are built anew with the players or p_stats page, so
+        # the index is updated even if the roster is the same.
+        self._changed(team_data['team'] for team_data in data
+                      if 'players' in team_data)
+        return diffs
+
+    def _changed(self, teams):
+        """Drops the match store and updates the player index.
+
+        :param teams: iterable of the title teams with new data.
+
+        """
+        self._match_store = None
+        if self._player_index is None:
+            return
+        for team in teams:
+            team = self.teams[team]
+            if 'players' in team._loaded:
+                self._player_index.update(team.team, team.players)
+
+    @staticmethod
+    def _get_digests(teams):
+        """Gets the page digests of the teams by team title."""
+
+        return dict((team.team, team.digests) for team in teams)
+
+    def _get_teams(self, teams=()):
+        """Gets the loaded teams.
+
+        :param teams: the sequence of title teams, by default all loaded
+        teams;
+        :return: list of KHLTeam instance.
+
+        """
+        return [self.get_team(team)
+                for team in (teams if teams else tuple(self.teams))]
+
+    def _get_data(self, teams, **kwargs):
+        """Parses the pages of the loaded teams in one run of the parser.
+
+        :param teams: list of KHLTeam instance;
+        :param kwargs: keyword arguments of KHLParser.get_data;
+        :return: list of the team dicts.
+
+        """
+        data = self._get_parser(teams).get_data(**kwargs)
+        return data if isinstance(data, list) else [data]
+
+    def _get_parser(self, teams):
+        """Creates the parser of the loaded teams without the index fetch.
+
+        :param teams: list of KHLTeam instance;
+        :return: KHLParser instance.
+
+        """
+        return _parser(
+            *(team.team for team in teams),
+            teams=dict((team.team, team._index_entry()) for team in teams),
+            **self._kwargs
+        )
+
+    @classmethod
+    def from_snapshot(cls, path, *teams, **kwargs):
+        """Loads instance from the snapshot file.
+
+        :param path: file path;
+        :param teams: the sequence of title teams, by default all teams of
+        the file;
+        :param kwargs: keyword arguments of KHLParser for the next loads;
+        :return: KHLLeague instance.
+
+        """
+        league = cls.__new__(cls)
+        league._kwargs = kwargs
+        league._lazy = False
+        league._match_store = None
+        league._player_index = None
+        with snapshot.Snapshot(path) as snap:
+            league.index = snap.index
+            league.teams = dict(
+                (team, KHLTeam.from_data(snap.get(team), **kwargs))
+                for team in (teams if teams else snap.teams)
+            )
+        return league
+
+    def to_snapshot(self, path):
+        """Saves the loaded teams and the teams index to the snapshot file.
+
+        :param path: file path.
+
+        """
+        snapshot.save(
+            path,
+            [team.to_data() for team in self.teams.values()],
+            self.index
+        )
+
+    def get_team(self, team):
+        """Gets the loaded team.
+
+        :param team: team title;
+        :return: KHLTeam instance.
+
+        """
+        try:
+            return self.teams[team]
+        except KeyError:
+            raise TeamNotExistError(team)
+
+    @property
+    def players(self):
+        """Gets the players of all loaded teams.
+
+        :return: list of KHLPlayer instance.
+
+        """
+        return [player for team in self.teams.values()
+                for player in team.players]
+
+    @property
+    def matches(self):
+        """Gets the matches of all loaded teams.
+
+        Each match is included once, the list is sorted by date.
+
+        :return: list of KHLEvent instance.
+
+        """
+        matches = {}
+        for team in self.teams.values():
+            for match in team.matches:
+                matches.setdefault((match.datetime, match.teams), match)
+        return sorted(matches.values(), key=lambda match: match.datetime)
+
+    def rank(self, field, split='total', avg=False, reverse=True):
+        """Ranks the loaded teams by the statistic.
+
+        :param field: field name of khl_team.stats.FIELDS;
+        :param split: total, home or away;
+        :param avg: average/percentage instead of the value;
+        :param reverse: the highest value first;
+        :return: list of tuple(team, value).
+
+        """
+        return rank(
+            (team.stats_record for team in self.teams.values()),
+            field, split, avg, reverse
+        )
+
+    @property
+    def match_store(self):
+        """Gets the columnar store of the matches of all loaded teams.
+
+        :return: MatchStore instance.
+
+        """
+        if self._match_store is None:
+            self._match_store = MatchStore(
+                match for team in self.teams.values()
+                for match in team.matches
+            )
+        return self._match_store
+
+    @property
+    def player_index(self):
+        """Gets the index of the players of all loaded teams.
+
+        The index is kept up to date by the loads and the refreshes, the
+        players moving between the teams are recorded (see
+        khl_team.players.PlayerIndex.moves).
+
+        :return: PlayerIndex instance.
+
+        """
+        if self._player_index is None:
+            self._player_index = PlayerIndex(self.players)
+        return self._player_index
+
+    def __str__(self):
+        return '%s(%d teams)' % (self.__class__.__name__, len(self.teams))
+
+    def __repr__(self):
+        return self.__str__()
+
+
 class KHLPlayer(object):
     """Player class."""
 
+    __slots__ = (
+        'name', 'team', 'f_name', 'l_name', 'number', 'role', 'date_birth',
+        'nationality', 'height', 'weight', 'stats', 'stats_record'
+    )
+    _ATTR_DATA = (
+        'team', 'number', 'name', 'role', 'nationality',
+        'date_birth', 'height', 'weight'
+    )
+
     def __init__(self, **kwargs):
         """Initial instance."""
 
@@ -175,14 +948,57 @@ class KHLPlayer(object):
         self.stats = None
         for attr in kwargs:
             setattr(self, attr, kwargs[attr])
+        self.stats_record = parse_player_stats(self.stats)
         self._set_names()
 
+    @classmethod
+    def from_rows(cls, players, instrument=None):
+        """Creates players from the parsed rows.
+
+        :param players: iterable of the player dicts of KHLParser.get_data;
+        :param instrument: Instrument instance measuring the construction,
+        by default the shared instrument;
+        :return: list of KHLPlayer instance.
+
+        """
+        new = cls.__new__
+        built = []
+        with (instrument if instrument else instruments.get_default()
+              ).measure('build', 'players') as measurement:
+            for row in players:
+                player = new(cls)
+                get = row.get
+                player.name = name = row['name']
+                player.team = get('team')
+                player.number = get('number')
+                player.role = get('role')
+                player.date_birth = get('date_birth')
+                player.nationality = get('nationality')
+                player.height = get('height')
+                player.weight = get('weight')
+                player.stats = stats = get('stats')
+                player.stats_record = parse_player_stats(stats)
+                player.f_name, player.l_name = split_name(name)
+                built.append(player)
+            measurement.rows = len(built)
+        return built
+
+    def to_data(self):
+        """Converts instance to the player dict of KHLParser.get_data.
+
+        :return: dict.
+
+        """
+        player_data = dict(
+            (attr, getattr(self, attr)) for attr in KHLPlayer._ATTR_DATA)
+        if self.stats is not None:
+            player_data['stats'] = self.stats
+        return player_data
+
     def _set_names(self):
         """Sets first and last name."""
 
-        split_name = self.name.split()
-        self.f_name = split_name[0]
-        self.l_name = split_name[2] if len(split_name) == 3 else split_name[1]
+        self.f_name, self.l_name = split_name(self.name)
 
     def __str__(self):
         return '%s(%s, %s)' % (self.__class__.__name__, self.name, self.number)
@@ -194,21 +1010,88 @@ class KHLPlayer(object):
 class KHLEvent(object):
     """Hockey event class."""
 
-    _TODAY = datetime.today()
+    __slots__ = ('teams', 'score', 'datetime', '_ics')
     _TITLE = 'Hockey: %s - %s'
     _DURATION = timedelta(hours=3)
     _REMIND = timedelta(minutes=15)
+    _ICS_CALENDAR = None
+    _ICS_CACHE_SIZE = 4
 
     def __init__(self, **kwargs):
         """Initial instance."""
 
-        self.teams = kwargs['teams']
-        self.score = kwargs['score']
-        self.datetime = datetime.strptime(
-            '%s:%s' % (kwargs['date'], kwargs['time']), '%d.%m.%Y:%H:%M'
-        )
-        self.is_finished = KHLEvent._TODAY > self.datetime
-        self.winner = self._get_winner() if self.is_finished else None
+        self._set(kwargs['teams'], kwargs['score'],
+                  _parse_datetime(kwargs['date'], kwargs['time']))
+
+    @classmethod
+    def from_rows(cls, matches, instrument=None):
+        """Creates events from the parsed rows.
+
+        :param matches: iterable of the match dicts of KHLParser.get_data;
+        :param instrument: Instrument instance measuring the construction,
+        by default the shared instrument;
+        :return: list of KHLEvent instance.
+
+        """
+        new = cls.__new__
+        events = []
+        with (instrument if instrument else instruments.get_default()
+              ).measure('build', 'matches') as measurement:
+            for match in matches:
+                event = new(cls)
+                event._set(match['teams'], match['score'],
+                           _parse_datetime(match['date'], match['time']))
+                events.append(event)
+            measurement.rows = len(events)
+        return events
+
+    def _set(self, teams, score, date_time):
+        """Sets the attributes.
+
+        :param teams: tuple of team titles (home, away);
+        :param score: tuple of int;
+        :param date_time: datetime instance.
+
+        """
+        self._ics = None
+        self.teams = teams
+        self.score = score
+        self.datetime = date_time
+
+    @property
+    def is_finished(self):
+        """The match has started by the current time."""
+
+        return datetime.today() > self.datetime
+
+    @property
+    def winner(self):
+        """Title of the winner team or None."""
+
+        return self._get_winner() if self.is_finished else None
+
+    def update(self, score):
+        """Sets the new score.
+
+        :param score: tuple of int.
+
+        """
+        self.score = score
+
+    def to_data(self):
+        """Converts instance to the match dict of KHLParser.get_data.
+
+        :return: dict.
+
+        """
+        date_time = self.datetime
+        return {
+            'date': '%02d.%02d.%04d' % (
+                date_time.day, date_time.month, date_time.year),
+            'time': '%02d:%02d' % (date_time.hour, date_time.minute),
+            'teams': self.teams,
+            'score': self.score
+        }
 
     def gen_ics_event(self, title=None, duration=None, remind=None):
         """Generates Event object.
@@ -219,6 +1102,9 @@ class KHLEvent(object):
         :return: Event instance.
 
         """
+        # icalendar is imported on the first use like the parser module.
+        from icalendar import Alarm, Event
+
         event = Event()
         alarm = Alarm()
         title = title if title else KHLEvent._TITLE
@@ -230,6 +1116,30 @@ class KHLEvent(object):
         event.add_component(alarm)
         return event
 
+    def to_ics(self, title=None, duration=None, remind=None):
+        """Serializes the event, the result is cached per arguments.
+
+        At most _ICS_CACHE_SIZE results are kept, the oldest is dropped.
+
+        :param title: event subject;
+        :param duration: datetime;
+        :param remind: datetime;
+        :return: byte string of VEVENT.
+
+        """
+        key = (title, duration, remind)
+        if self._ics is None:
+            self._ics = {}
+        else:
+            ics = self._ics.get(key)
+            if ics is not None:
+                return ics
+            if len(self._ics) >= KHLEvent._ICS_CACHE_SIZE:
+                del self._ics[next(iter(self._ics))]
+        ics = self._ics[key] = self.gen_ics_event(
+            title, duration, remind).to_ical()
+        return ics
+
     @staticmethod
     def gen_ics(match_list, **kwargs):
         """Generates a byte string with ics headers.
@@ -239,12 +1149,70 @@ class KHLEvent(object):
         :return: byte string.
 
         """
-        calendar = Calendar()
-        calendar['version'] = '2.0'
+        with instruments.get_default().measure('ics', 'gen_ics') as \
+                measurement:
+            parts = list(KHLEvent.iter_ics(match_list, unique=False, **kwargs))
+            ics = b''.join(parts)
+            measurement.rows = len(parts) - 2
+            measurement.bytes = len(ics)
+        return ics
+
+    @staticmethod
+    def iter_ics(match_list, unique=True, **kwargs):
+        """Generates the ics file by parts without building a Calendar.
+
+        :param match_list: iterable of KHLEvent instance, e.g. the matches
+        of several teams;
+        :param unique: skip the repeated matches (same time and teams);
+        :param kwargs: dict with keys(title, duration, remind);
+        :return: generator of byte strings.
+
+        """
+        header, footer = KHLEvent._get_ics_calendar()
+        yield header
+        seen = set()
         for match in match_list:
-            event = match.gen_ics_event(**kwargs)
-            calendar.add_component(event)
-        return calendar.to_ical()
+            if unique:
+                key = (match.datetime, match.teams)
+                if key in seen:
+                    continue
+                seen.add(key)
+            yield match.to_ics(**kwargs)
+        yield footer
+
+    @staticmethod
+    def write_ics(file_, match_list, unique=True, **kwargs):
+        """Writes the ics file by parts.
+
+        :param file_: binary file-like object;
+        :param match_list: iterable of KHLEvent instance;
+        :param unique: skip the repeated matches (same time and teams);
+        :param kwargs: dict with keys(title, duration, remind);
+        :return: number of written bytes.
+
+        """
+        size = 0
+        for part in KHLEvent.iter_ics(match_list, unique, **kwargs):
+            file_.write(part)
+            size += len(part)
+        return size
+
+    @staticmethod
+    def _get_ics_calendar():
+        """Gets the header and the footer of the calendar.
+
+        :return: tuple of byte strings.
+
+        """
+        if KHLEvent._ICS_CALENDAR is None:
+            from icalendar import Calendar
+
+            calendar = Calendar()
+            calendar['version'] = '2.0'
+            ics = calendar.to_ical()
+            pos = ics.index(b'END:VCALENDAR')
+            KHLEvent._ICS_CALENDAR = (ics[:pos], ics[pos:])
+        return KHLEvent._ICS_CALENDAR
 
     def _get_winner(self):
         """Gets winner of match.
@@ -252,7 +1220,7 @@ class KHLEvent(object):
         :return: team title.
 
         """
-        if self.score[0] != self.score[1]:
+        if len(self.score) == 2 and self.score[0] != self.score[1]:
             winner = self.teams[0] if self.score[0] > self.score[1] \
                 else self.teams[1]
         else:
@@ -265,3 +1233,36 @@ class KHLEvent(object):
 
     def __repr__(self):
         return self.__str__()
+
+
+@lru_cache(maxsize=4096)
+def _parse_datetime(date, time):
+    """Converts the date and the time of the page to datetime.
+
+    The values repeat across the teams and the seasons, so the results are
+    cached.
+
+    :param date: string like '24.08.2016';
+    :param time: string like '12:30';
+    :return: datetime instance.
+
+    """
+    try:
+        day, month, year = date.split('.')
+        hour, minute = time.split(':')
+        return datetime(int(year), int(month), int(day),
+                        int(hour), int(minute))
+    except ValueError:
+        return datetime.strptime('%s:%s' % (date, time), '%d.%m.%Y:%H:%M')
+
+
+def _parser(*args, **kwargs):
+    """Creates KHLParser instance.
+
+    The parser module is imported on the first use, so teams loaded from
+    snapshots do not import BeautifulSoup.
+
+    """
+    from khl_team.parser import KHLParser
+
+    return KHLParser(*args, **kwargs)
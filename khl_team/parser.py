@@ -10,14 +10,107 @@ This module contains a class that parsing information about hockey teams:
 """
 
 
+import asyncio
+import hashlib
+import logging
 import re
+import threading
 
-from urllib import request
-from urllib.parse import urljoin
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 
+from khl_team import instrument as instruments
+from khl_team import transport as transports
 from khl_team.exceptions import TeamNotExistError
+from khl_team.players import split_name
+from khl_team.table import Table, iter_cells
+
+
+logger = logging.getLogger(__name__)
+# Process pools reused by the parsers (key - number of processes).
+_process_pools = {}
+_process_pools_lock = threading.Lock()
+# Parsers of the worker process (key - backend).
+_worker_parsers = {}
+
+
+class PageRegistry(object):
+    """Registry of the pages of one run.
+
+    Each URL is downloaded and parsed once, all extractors share the parsed
+    document until the registry is released.
+
+    """
+
+    def __init__(self):
+        """Initial instance."""
+
+        self._pages = {}
+        self._soups = {}
+        self.fetched = 0
+        self.saved = 0
+
+    def add(self, url, html):
+        """Adds the fetched page body.
+
+        :param url: page URL;
+        :param html: byte string.
+
+        """
+        self._pages[url] = html
+
+    def get_html(self, url, fetch):
+        """Gets the page body, the page is fetched once.
+
+        :param url: page URL;
+        :param fetch: callable(url) returning the page body;
+        :return: byte string.
+
+        """
+        if url not in self._pages:
+            self._pages[url] = fetch(url)
+        return self._pages[url]
+
+    def get_soup(self, url, fetch, parse):
+        """Gets the parsed document of the URL.
+
+        :param url: page URL;
+        :param fetch: callable(url) returning the page body;
+        :param parse: callable(html) returning the parsed document;
+        :return: BeautifulSoup instance.
+
+        """
+        if url in self._soups:
+            self.saved += 1
+            return self._soups[url]
+        html = self._pages.pop(url, None)
+        if html is None:
+            html = fetch(url)
+        self.fetched += 1
+        soup = self._soups[url] = parse(html)
+        return soup
+
+    def release(self):
+        """Drops all pages and documents."""
+
+        self._pages.clear()
+        self._soups.clear()
+
+    def reset(self):
+        """Releases the registry and resets the counters."""
+
+        self.release()
+        self.fetched = 0
+        self.saved = 0
+
+    def __str__(self):
+        return '%s(fetched=%d, saved=%d)' % (
+            self.__class__.__name__, self.fetched, self.saved)
+
+    def __repr__(self):
+        return self.__str__()
 
 
 class KHLParser(object):
@@ -36,24 +129,132 @@ class KHLParser(object):
     }
     _TAG_CLASSES = {
         'teams': 'sport__tiles__i',
-        'matches': (
-            'sport__table__tstat__td ',
-            'sport__table__tstat__td _big',
-            'sport__table__tstat__td _count _big'
-        ),
+        'matches': 'sport__table__tstat',
         'meta': 'sport__info__data__i',
     }
-    _MATCH_KEYS = ('date', 'time', 'teams', 'score')
+    # Tags used by the extractors of each page, other tags are not built.
+    _PAGE_TAGS = {
+        'teams': {'name': 'a', 'class_': _TAG_CLASSES['teams']},
+        'matches': {
+            'name': ('table', 'div'),
+            'class_': (_TAG_CLASSES['matches'], _TAG_CLASSES['meta'])
+        },
+        'players': {'name': 'tr'},
+        'p_stats': {'name': 'tr'},
+        't_stats': {'name': 'tr'}
+    }
+    # Tables of the pages: keys of the columns and regexes of the headers.
+    _TABLES = {
+        'matches': Table(
+            ('date', r'^дата'),
+            ('time', r'^время'),
+            ('teams', r'^матч'),
+            ('score', r'^сч[её]т'),
+            collapse=True
+        ),
+        'players': Table(
+            ('number', r'^(№|номер)'),
+            ('name', r'^игрок'),
+            ('role', r'^амплуа'),
+            ('nationality', r'^гражданство'),
+            ('date_birth', r'^дата'),
+            ('height', r'^рост'),
+            ('weight', r'^вес')
+        ),
+        'p_stats': Table(
+            ('number', r'^(№|номер)'),
+            ('name', r'^игрок'),
+            ('games', r'^и$'),
+            ('goals', r'^ш$'),
+            ('tbl', r'^\+/-$'),
+            ('assist', r'^п$'),
+            ('goals_pass', r'^о$'),
+            ('penalty', r'^штр')
+        )
+    }
+    _HOME_TEAM = re.compile(r'\w+(\s\w+)*')
+    _GUEST_TEAM = re.compile(r'\w+(\s\w+)*$')
+    _SCORE = re.compile(r'\d+')
+    # html5lib builds the whole tree regardless of SoupStrainer.
+    _BACKENDS = {'html.parser': True, 'lxml': True, 'html5lib': False}
+    _PAGE_KEYS = ('matches', 'players', 'p_stats', 't_stats')
+    # Extractors in the order of running and the pages they read.
+    _EXTRACTORS = (
+        ('_parse_matches', 'matches'),
+        ('_parse_meta', 'matches'),
+        ('_parse_players', 'players'),
+        ('_parse_players_stat', 'p_stats'),
+        ('_parse_team_stat', 't_stats')
+    )
+    # Keys of the team dict filled by the extractors, their size is the rows.
+    _EXTRACTOR_ROWS = {
+        '_parse_matches': 'matches',
+        '_parse_players': 'players',
+        '_parse_players_stat': 'players',
+        '_parse_team_stat': 'stats'
+    }
+    # Simultaneous requests to one host of the asyncio API by default.
+    _ASYNC_HOST_LIMIT = 4
+    # Pages extracted together: player stats are attached to the players.
+    _LINKED_PAGES = {
+        'players': ('players', 'p_stats'),
+        'p_stats': ('players', 'p_stats')
+    }
 
-    def __init__(self, *args):
+    def __init__(self, *args, teams=None, cache=None, workers=None,
+                 host_limit=None, backend='html.parser', transport=None,
+                 instrument=None, profile=None, processes=None,
+                 base_url=None, rate=None, burst=1):
         """Initial instance.
 
-        :param args: the sequence of title teams.
+        :param args: the sequence of title teams;
+        :param teams: dict of the teams index (see teams_index), by default
+        the index is parsed on the first use;
+        :param cache: PageCache instance;
+        :param workers: number of threads fetching the pages of all teams
+        concurrently, by default the pages are fetched one by one;
+        :param host_limit: max number of simultaneous requests to one host,
+        by default equals to workers;
+        :param backend: BeautifulSoup tree builder: html.parser, lxml or
+        html5lib;
+        :param transport: Transport instance requesting the pages, by
+        default the pooled HTTPTransport shared by the parsers of the
+        process;
+        :param instrument: Instrument instance measuring the stages, by
+        default the instrument shared by the parsers of the process;
+        :param profile: file path, each run of get_data is profiled by
+        cProfile and the stats are dumped to the file;
+        :param processes: number of worker processes building the trees and
+        running the extractors, by default the pages are extracted in the
+        calling thread. The pages are fetched first (by workers threads),
+        the pool of processes is reused by all parsers;
+        :param base_url: URL of the site or of its mirror, by default
+        championat.com;
+        :param rate: requests per second to one host, by default unlimited.
+        The parsers with the same rate and burst share one transport, so the
+        limit holds for the whole process, ignored with transport;
+        :param burst: max number of requests sent without waiting.
 
         """
         self._team = None
         self.team = args
-        self._teams_list = self._parse_teams()
+        self.cache = cache
+        self.workers = workers
+        self.host_limit = host_limit if host_limit else workers
+        if backend not in KHLParser._BACKENDS:
+            raise ValueError('unknown backend "%s"' % backend)
+        self.backend = backend
+        self.transport = transport if transport else \
+            transports.get_default(rate, burst)
+        self.instrument = instrument if instrument else \
+            instruments.get_default()
+        self.profile = profile
+        self.processes = processes
+        self.base_url = base_url if base_url else KHLParser._URL['base']
+        self.registry = PageRegistry()
+        self._host_locks = {}
+        self._lock = threading.Lock()
+        self._teams = teams
         self._team_dict = None
 
     @property
@@ -68,15 +269,28 @@ class KHLParser(object):
 
         self._team = (value,) if isinstance(value, str) else value
 
+    @property
+    def teams_index(self):
+        """Getter of the teams index.
+
+        :return: dict (key - team title, value - dict with keys: team,
+        location, urls).
+
+        """
+        if self._teams is None:
+            self._teams = self._parse_teams()
+        return self._teams
+
     def _parse_teams(self):
         """Parsing a page with a list of teams.
 
-        :return: list of the dicts with keys: team, matches, location, urls.
+        :return: dict (key - team title, value - dict with keys: team,
+        location, urls).
 
         """
         team_dict = {}
-        dict_list = []
-        soup = self._get_soup(KHLParser._get_url(key='teams'))
+        teams = {}
+        soup = self._get_soup(self._get_url(key='teams'), 'teams')
         for link in soup.find_all('a', KHLParser._TAG_CLASSES['teams']):
             team_dict['team'] = re.search(
                 r'(\w+\s?){2}\w+', link.text).group(0)
@@ -84,27 +298,28 @@ class KHLParser(object):
                 team_dict['team'], '').strip()
             team_url = link['href'].replace(KHLParser._URL['matches'], '')
             team_dict['urls'] = {
-                'matches': KHLParser._get_url(url=team_url, key='matches'),
-                'players': KHLParser._get_url(url=team_url, key='players'),
-                'p_stats': KHLParser._get_url(url=team_url, key='p_stats'),
-                't_stats': KHLParser._get_url(url=team_url, key='t_stats')
+                'matches': self._get_url(url=team_url, key='matches'),
+                'players': self._get_url(url=team_url, key='players'),
+                'p_stats': self._get_url(url=team_url, key='p_stats'),
+                't_stats': self._get_url(url=team_url, key='t_stats')
             }
-            dict_list.append(team_dict.copy())
+            teams[team_dict['team']] = team_dict.copy()
             team_dict.clear()
-        return dict_list
+        return teams
 
     def _get_teams_dict(self):
         """Fetches team dictionaries.
 
+        The dicts are copied, so the shared index is not changed by parsers.
+
         :return: list of the teams dict.
 
         """
         team_list = []
         for team in self._team:
             try:
-                team_list.append(list(
-                    filter(lambda d: d['team'] == team, self._teams_list))[0])
-            except IndexError:
+                team_list.append(self.teams_index[team].copy())
+            except KeyError:
                 raise TeamNotExistError(team)
         return team_list
 
@@ -115,28 +330,20 @@ class KHLParser(object):
         time, teams, score.
 
         """
-        tmp_list = []
         match_list = []
-        soup = self._get_soup(self._team_dict['urls']['matches'])
-        for td in soup.find_all('td', KHLParser._TAG_CLASSES['matches']):
-            tmp_list.append(' '.join(td.text.split()))
-            if len(tmp_list) == 4:
-                match_dict = dict((key, value) for key, value in zip(
-                    KHLParser._MATCH_KEYS, tmp_list))
-                # Parse teams string.
-                home_team = re.match(
-                    r'\w+(\s\w+)*', match_dict['teams']).group(0)
-                guest_team = re.search(
-                    r'\w+(\s\w+)*$', match_dict['teams']).group(0)
-                match_dict['teams'] = (home_team, guest_team)
-                # Parse score string.
-                score_list = re.findall(r'\d+', match_dict['score'])
-                score = tuple((int(sc) for sc in score_list))
-                match_dict['score'] = score
-                match_list.append(match_dict.copy())
-                match_dict.clear()
-                tmp_list.clear()
-            self._team_dict['matches'] = match_list
+        soup = self._get_soup(self._team_dict['urls']['matches'], 'matches')
+        for match_dict in KHLParser._TABLES['matches'].rows(soup):
+            # Parse teams string.
+            home_team = KHLParser._HOME_TEAM.match(match_dict['teams'])
+            guest_team = KHLParser._GUEST_TEAM.search(match_dict['teams'])
+            if home_team is None or guest_team is None:
+                continue
+            match_dict['teams'] = (home_team.group(0), guest_team.group(0))
+            # Parse score string.
+            score_list = KHLParser._SCORE.findall(match_dict['score'])
+            match_dict['score'] = tuple(int(sc) for sc in score_list)
+            match_list.append(match_dict)
+        self._team_dict['matches'] = match_list
 
     def _parse_meta(self):
         """Parses additional information.
@@ -146,7 +353,7 @@ class KHLParser(object):
 
         """
         tmp_list = []
-        soup = self._get_soup(self._team_dict['urls']['matches'])
+        soup = self._get_soup(self._team_dict['urls']['matches'], 'matches')
         for div in soup.find_all('div', KHLParser._TAG_CLASSES['meta']):
             try:
                 tmp_list.append(''.join(div.a.text.strip()))
@@ -182,32 +389,18 @@ class KHLParser(object):
         height, weight)).
 
         """
-        tmp_list = []
         none_id = 0
-        self._team_dict['players'] = {}
-        soup = self._get_soup(self._team_dict['urls']['players'])
-        for td in soup.find_all('td'):
-            val = ''.join(td.text).strip()
-            if val:
-                tmp_list.append(val)
-                if len(tmp_list) == 1 \
-                        and ''.join(tmp_list[0].split()).isalpha():
-                    tmp_list.insert(0, 'None%d' % none_id)
-                    none_id += 1
-            if len(tmp_list) == 7:
-                tmp_dict = {
-                    'team': self._team_dict['team'],
-                    'number': tmp_list[0],
-                    'name': tmp_list[1],
-                    'role': tmp_list[2],
-                    'nationality': tmp_list[3],
-                    'date_birth': tmp_list[4],
-                    'height': tmp_list[5],
-                    'weight': tmp_list[6]
-                }
-                self._team_dict['players'][tmp_list[0]] = tmp_dict.copy()
-                tmp_list.clear()
-                tmp_dict.clear()
+        players = self._team_dict['players'] = {}
+        soup = self._get_soup(self._team_dict['urls']['players'], 'players')
+        for player in KHLParser._TABLES['players'].rows(soup):
+            if not player['name']:
+                continue
+            # Players without number are keyed by a placeholder.
+            if not player['number']:
+                player['number'] = 'None%d' % none_id
+                none_id += 1
+            player['team'] = self._team_dict['team']
+            players[player['number']] = player
 
     def _parse_players_stat(self):
         """Parse the page with player statistics.
@@ -216,36 +409,24 @@ class KHLParser(object):
         assist, goals_pass, penalty).
 
         """
-        tmp_list = []
-        soup = self._get_soup(self._team_dict['urls']['p_stats'])
-        for td in soup.find_all('td'):
-            tmp_list.append(''.join(td.text.strip()))
-            if len(tmp_list) == 8:
-                number, stats = (tmp_list[0], tmp_list[2:])
-                tmp_dict = {
-                    'games': tmp_list[2],
-                    'goals': tmp_list[3],
-                    'tbl': tmp_list[4],
-                    'assist': tmp_list[5],
-                    'goals_pass': tmp_list[6],
-                    'penalty': tmp_list[7]
-                }
-                if number:
-                    self._team_dict['players'][number]['stats'] = \
-                        tmp_dict.copy()
-                # if the player has no number then to map dict by name.
-                else:
-                    name = list(filter(None, tmp_list))[0]
-                    for pl_num in self._team_dict['players']:
-                        player = self._team_dict['players'][pl_num]
-                        split_name = player['name'].split()
-                        f_name = split_name[0]
-                        l_name = split_name[2] if len(split_name) == 3 else\
-                            split_name[1]
-                        if tuple(name.split()) == (f_name, l_name):
-                            player['stats'] = tmp_dict.copy()
-                tmp_list.clear()
-                tmp_dict.clear()
+        by_name = None
+        players = self._team_dict['players']
+        soup = self._get_soup(self._team_dict['urls']['p_stats'], 'p_stats')
+        for stats in KHLParser._TABLES['p_stats'].rows(soup):
+            number = stats.pop('number')
+            name = stats.pop('name')
+            if number in players:
+                players[number]['stats'] = stats
+            # if the player has no number then to map dict by name.
+            elif name:
+                if by_name is None:
+                    by_name = {}
+                    for player in players.values():
+                        by_name.setdefault(
+                            split_name(player['name']), []
+                        ).append(player)
+                for player in by_name.get(tuple(name.split()), ()):
+                    player['stats'] = dict(stats)
 
     def _parse_team_stat(self):
         """Parse the page with team statistics.
@@ -253,44 +434,299 @@ class KHLParser(object):
         Adds to the team dict a new key 'stats' with dict.
 
         """
-        tmp_list = []
-        tmp_dict = {}
-        key = None
-        soup = self._get_soup(self._team_dict['urls']['t_stats'])
-        for td in soup.find_all('td'):
-            val = td.text
-            if val.strip():
-                if val.split()[0].isalpha():
-                    if key:
-                        values = tmp_list.copy() if len(tmp_list) < 7 \
-                            else tmp_list[:3]
-                        tmp_dict[key] = self._format_team_val(values)
-                        tmp_list.clear()
-                        key = val
-                    else:
-                        key = val
-                else:
-                    tmp_list.append(val)
-        self._team_dict['stats'] = tmp_dict.copy()
-
-    def get_data(self):
+        stats = {}
+        soup = self._get_soup(self._team_dict['urls']['t_stats'], 't_stats')
+        for cells, is_header in iter_cells(soup):
+            key = cells[0]
+            values = [value for value in cells[1:] if value]
+            if is_header or not values or not key or \
+                    not key.split()[0].isalpha():
+                continue
+            stats[key] = self._format_team_val(
+                values if len(values) < 7 else values[:3])
+        self._team_dict['stats'] = stats
+
+    def get_data(self, digests=None, pages=None):
         """Runs all parsers.
 
+        :param digests: dict (key - team title, value - dict 'digests' of
+        the team dict of the previous run), only the changed pages are
+        extracted;
+        :param pages: kinds of pages (keys of KHLParser._URL) to fetch and
+        extract, by default all pages of the team;
+        :return: list with team dicts.
+
+        """
+        return self._run(digests, pages)
+
+    async def aget_data(self, digests=None, pages=None, timeout=None):
+        """Runs all parsers without blocking the event loop.
+
+        The pages are requested concurrently by the coroutine of the
+        transport (at most host_limit requests to one host), the trees are
+        built and extracted in the default executor. The result is the same
+        as of get_data. One call runs at a time per instance.
+
+        :param digests: see get_data;
+        :param pages: see get_data;
+        :param timeout: seconds of the whole call, by default unlimited;
+        :return: list with team dicts.
+
+        """
+        return await asyncio.wait_for(self._aget_data(digests, pages),
+                                      timeout)
+
+    async def ateams_index(self, timeout=None):
+        """Gets the teams index without blocking the event loop.
+
+        :param timeout: seconds of the call, by default unlimited;
+        :return: see teams_index.
+
+        """
+        if self._teams is None:
+            await asyncio.wait_for(self._aparse_teams({}), timeout)
+        return self._teams
+
+    async def _aget_data(self, digests, pages):
+        """Fetches the pages by the coroutines, then runs get_data.
+
         :return: list with team dicts.
 
         """
+        limits = {}
+        if self._teams is None:
+            await self._aparse_teams(limits)
+        pages = self._get_pages(pages)
+        urls = [(team_dict['urls'][key], key)
+                for team_dict in self._get_teams_dict() for key in pages]
+        tasks = [asyncio.ensure_future(self._afetch(url, kind, limits))
+                 for url, kind in urls]
+        try:
+            bodies = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._run, digests, pages,
+            dict((url, body) for (url, _), body in zip(urls, bodies))
+        )
+
+    async def _aparse_teams(self, limits):
+        """Fetches the page of teams by the coroutine and parses it.
+
+        :param limits: dict of the host semaphores of the call.
+
+        """
+        url = self._get_url(key='teams')
+        self.registry.add(url, await self._afetch(url, 'teams', limits))
+        self._teams = await asyncio.get_running_loop().run_in_executor(
+            None, self._parse_teams)
+
+    async def _afetch(self, url, kind, limits):
+        """Fetches the page body by the coroutine through the cache.
+
+        :param url: page URL;
+        :param kind: kind of page (key of KHLParser._URL);
+        :param limits: dict (key - host, value - asyncio.Semaphore) shared
+        by the requests of the call;
+        :return: byte string.
+
+        """
+        host = urlsplit(url).netloc
+        if host not in limits:
+            limits[host] = asyncio.Semaphore(
+                self.host_limit if self.host_limit
+                else KHLParser._ASYNC_HOST_LIMIT)
+        async with limits[host], \
+                self.instrument.ameasure('fetch', kind) as measurement:
+            if self.cache:
+                body = await self.cache.aget(url, kind, self.transport.afetch)
+            else:
+                body = (await self.transport.afetch(url))[2]
+            measurement.bytes = len(body)
+            return body
+
+    def _run(self, digests=None, pages=None, bodies=None):
+        """Runs get_data, profiled if profile is set.
+
+        :param bodies: dict (key - URL, value - page body) of the fetched
+        pages.
+
+        """
+        if self.profile:
+            with instruments.Instrument.profile(self.profile):
+                return self._get_data(digests, pages, bodies)
+        return self._get_data(digests, pages, bodies)
+
+    def _get_data(self, digests=None, pages=None, bodies=None):
+        """Runs all parsers (see get_data)."""
+
         data = []
-        for self._team_dict in self._get_teams_dict():
-            self._parse_matches()
-            self._parse_meta()
-            self._parse_players()
-            self._parse_players_stat()
-            self._parse_team_stat()
-            data.append(self._team_dict.copy())
+        teams = self._get_teams_dict()
+        pages = self._get_pages(pages)
+        if self.processes:
+            data = self._get_data_processes(teams, pages, digests, bodies)
+            return data if len(data) > 1 else data[0]
+        executor = ThreadPoolExecutor(self.workers) \
+            if self.workers and bodies is None else None
+        futures = self._prefetch(executor, teams, pages) if executor else {}
+        self.registry.reset()
+        try:
+            for self._team_dict in teams:
+                for url in self._team_dict['urls'].values():
+                    if url in futures:
+                        self.registry.add(url, futures[url].result())
+                    elif bodies and url in bodies:
+                        self.registry.add(url, bodies[url])
+                self._extract_team(
+                    pages,
+                    digests.get(self._team_dict['team']) if digests else None
+                )
+                data.append(self._team_dict.copy())
+                self.registry.release()
+        finally:
+            self.registry.release()
+            if executor:
+                for future in futures.values():
+                    future.cancel()
+                executor.shutdown()
+        logger.debug('%s: %d pages fetched, %d duplicate fetches saved',
+                     self, self.registry.fetched, self.registry.saved)
         return data if len(data) > 1 else data[0]
 
-    @classmethod
-    def _get_url(cls, url=None, key=None):
+    def _get_data_processes(self, teams, pages, digests=None, bodies=None):
+        """Fetches the pages, then extracts the teams in the process pool.
+
+        :param teams: list of the teams dict;
+        :param pages: kinds of pages;
+        :param digests: see get_data;
+        :param bodies: dict (key - URL, value - page body) of the fetched
+        pages;
+        :return: list with team dicts.
+
+        """
+        bodies = self._fetch_all(teams, pages, bodies)
+        tasks = [(
+            self.backend,
+            team_dict,
+            pages,
+            digests.get(team_dict['team']) if digests else None,
+            dict((team_dict['urls'][key], bodies[team_dict['urls'][key]])
+                 for key in pages)
+        ) for team_dict in teams]
+        executor = _get_process_pool(self.processes)
+        chunksize = max(1, len(tasks) // (self.processes * 4))
+        data = []
+        for team_dict, measurements in executor.map(
+                _extract_in_process, tasks, chunksize=chunksize):
+            for measurement in measurements:
+                self.instrument.add(measurement)
+            data.append(team_dict)
+        return data
+
+    def _fetch_all(self, teams, pages, bodies=None):
+        """Fetches the pages of all teams.
+
+        :param teams: list of the teams dict;
+        :param pages: kinds of pages;
+        :param bodies: dict of the pages fetched already;
+        :return: dict (key - URL, value - page body).
+
+        """
+        bodies = dict(bodies) if bodies else {}
+        missing = [(team_dict['urls'][key], key)
+                   for team_dict in teams for key in pages
+                   if team_dict['urls'][key] not in bodies]
+        if self.workers:
+            with ThreadPoolExecutor(self.workers) as executor:
+                fetched = list(executor.map(
+                    lambda item: self._fetch(*item), missing))
+        else:
+            fetched = [self._fetch(url, kind) for url, kind in missing]
+        bodies.update(zip((url for url, _ in missing), fetched))
+        return bodies
+
+    def _extract_team(self, pages, digests=None):
+        """Runs the extractors of the changed pages of the current team.
+
+        :param pages: kinds of pages;
+        :param digests: dict of the previous digests of the team.
+
+        """
+        changed = self._get_changed_pages(pages, digests)
+        for extractor, page in KHLParser._EXTRACTORS:
+            if page in changed:
+                self._extract(extractor)
+
+    def _extract(self, extractor):
+        """Runs the extractor, the rows are counted by _EXTRACTOR_ROWS.
+
+        :param extractor: name of the method.
+
+        """
+        with self.instrument.measure('extract', extractor) as measurement:
+            getattr(self, extractor)()
+            key = KHLParser._EXTRACTOR_ROWS.get(extractor)
+            rows = self._team_dict.get(key) if key else None
+            measurement.rows = len(rows) if rows else 0
+
+    @staticmethod
+    def _get_pages(pages=None):
+        """Adds the linked pages to the requested kinds of pages.
+
+        :param pages: iterable of the kinds of pages, by default all pages;
+        :return: tuple of the kinds of pages in the order of _PAGE_KEYS.
+
+        """
+        if pages is None:
+            return KHLParser._PAGE_KEYS
+        linked = set()
+        for page in pages:
+            linked.update(KHLParser._LINKED_PAGES.get(page, (page,)))
+        return tuple(key for key in KHLParser._PAGE_KEYS if key in linked)
+
+    def _get_changed_pages(self, pages, digests=None):
+        """Fetches the pages of the team and compares their digests.
+
+        Adds to the team dict a new key 'digests' with dict (key - kind of
+        page, value - SHA-1 of the page).
+
+        :param pages: kinds of pages;
+        :param digests: dict of the previous digests, by default all pages
+        are changed;
+        :return: set of the kinds of changed pages.
+
+        """
+        changed = set()
+        self._team_dict['digests'] = {}
+        for key in pages:
+            html = self.registry.get_html(
+                self._team_dict['urls'][key],
+                lambda url: self._fetch(url, key)
+            )
+            digest = hashlib.sha1(html).hexdigest()
+            self._team_dict['digests'][key] = digest
+            if not digests or digests.get(key) != digest:
+                changed.update(KHLParser._LINKED_PAGES.get(key, (key,)))
+        return changed
+
+    def _prefetch(self, executor, teams, pages):
+        """Submits the pages of all teams to the executor.
+
+        :param executor: ThreadPoolExecutor instance;
+        :param teams: list of the teams dict;
+        :param pages: kinds of pages;
+        :return: dict (key - URL, value - Future of the page body).
+
+        """
+        futures = {}
+        for team_dict in teams:
+            for key in pages:
+                url = team_dict['urls'][key]
+                futures[url] = executor.submit(self._fetch, url, key)
+        return futures
+
+    def _get_url(self, url=None, key=None):
         """Joins _URL path.
 
         :param url: root path;
@@ -299,18 +735,70 @@ class KHLParser(object):
 
         """
         url = url if url else ''
-        path = urljoin(url, cls._URL[key])
-        return urljoin(cls._URL['base'], path)
+        path = urljoin(url, KHLParser._URL[key])
+        return urljoin(self.base_url, path)
 
-    @staticmethod
-    def _get_soup(url):
+    def _get_soup(self, url, kind):
         """Create a BeautifulSoup object of _URL.
 
+        :param url: page URL;
+        :param kind: kind of page (key of KHLParser._URL);
+        :return: BeautifulSoup instance.
+
+        """
+        return self.registry.get_soup(
+            url,
+            lambda page_url: self._fetch(page_url, kind),
+            lambda html: self._parse_html(html, kind)
+        )
+
+    def _parse_html(self, html, kind):
+        """Builds the tree of the tags used by the extractors of the page.
+
+        :param html: byte string;
+        :param kind: kind of page (key of KHLParser._PAGE_TAGS);
         :return: BeautifulSoup instance.
 
         """
-        html = request.urlopen(url).read()
-        return BeautifulSoup(html, 'html.parser')
+        parse_only = SoupStrainer(**KHLParser._PAGE_TAGS[kind]) \
+            if KHLParser._BACKENDS[self.backend] else None
+        with self.instrument.measure('parse', kind) as measurement:
+            measurement.bytes = len(html)
+            return BeautifulSoup(html, self.backend, parse_only=parse_only)
+
+    def _fetch(self, url, kind):
+        """Fetches the page body through the cache.
+
+        The number of simultaneous requests to one host is limited by
+        host_limit.
+
+        :param url: page URL;
+        :param kind: kind of page (key of KHLParser._URL);
+        :return: byte string.
+
+        """
+        with self._host_lock(url), \
+                self.instrument.measure('fetch', kind) as measurement:
+            if self.cache:
+                body = self.cache.get(url, kind, self.transport.fetch)
+            else:
+                body = self.transport.fetch(url)[2]
+            measurement.bytes = len(body)
+            return body
+
+    def _host_lock(self, url):
+        """Gets the semaphore of the URL host.
+
+        :param url: page URL;
+        :return: BoundedSemaphore instance.
+
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._host_locks:
+                self._host_locks[host] = threading.BoundedSemaphore(
+                    self.host_limit if self.host_limit else 1)
+            return self._host_locks[host]
 
     @staticmethod
     def _format_team_val(values):
@@ -338,3 +826,45 @@ class KHLParser(object):
 
     def __repr__(self):
         return self.__str__()
+
+
+def _get_process_pool(processes):
+    """Gets the process pool shared by the parsers.
+
+    :param processes: number of processes;
+    :return: ProcessPoolExecutor instance.
+
+    """
+    with _process_pools_lock:
+        if processes not in _process_pools:
+            _process_pools[processes] = ProcessPoolExecutor(processes)
+        return _process_pools[processes]
+
+
+def _extract_in_process(task):
+    """Extracts one team in the worker process.
+
+    The parser of the backend is created once per process.
+
+    :param task: tuple(backend, team dict, kinds of pages, previous digests,
+    dict of the page bodies by URL);
+    :return: tuple(team dict, list of Measurement).
+
+    """
+    backend, team_dict, pages, digests, bodies = task
+    parser = _worker_parsers.get(backend)
+    if parser is None:
+        parser = _worker_parsers[backend] = KHLParser(
+            backend=backend, teams={})
+    measurements = []
+    parser.instrument = instruments.Instrument()
+    parser.instrument.add_hook(measurements.append)
+    parser.registry.reset()
+    for url, body in bodies.items():
+        parser.registry.add(url, body)
+    parser._team_dict = team_dict
+    try:
+        parser._extract_team(pages, digests)
+    finally:
+        parser.registry.release()
+    return team_dict, measurements
@@ -0,0 +1,286 @@
+"""Players module.
+
+This module contains the league-wide index of players. Players are keyed by
+normalized name, team and number, the identity of a player (normalized name
+and date of birth) is kept across the teams, so a player moving to another
+team is tracked.
+
+"""
+
+
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import date
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+
+Move = namedtuple('Move', ('player', 'from_team', 'to_team'))
+
+
+def split_name(name):
+    """Gets the first and the last name.
+
+    :param name: full name 'First Middle Last' or 'First Last';
+    :return: tuple(first name, last name).
+
+    """
+    split = name.split()
+    return split[0], split[2] if len(split) == 3 else split[1]
+
+
+@lru_cache(maxsize=8192)
+def normalize(name):
+    """Normalizes the name for the lookup.
+
+    Lower case, 'ё' is replaced by 'е', spaces are collapsed.
+
+    :param name: string;
+    :return: string.
+
+    """
+    return ' '.join(name.lower().replace('ё', 'е').split())
+
+
+@lru_cache(maxsize=8192)
+def parse_date(value):
+    """Converts the date of the page ('24.08.1990') to date or None."""
+
+    try:
+        day, month, year = value.split('.')
+        return date(int(year), int(month), int(day))
+    except (AttributeError, ValueError):
+        return None
+
+
+def get_identity(player):
+    """Gets the identity of the player kept across the teams.
+
+    :param player: KHLPlayer instance;
+    :return: tuple(normalized name, date of birth).
+
+    """
+    return normalize(player.name), player.date_birth
+
+
+class PlayerIndex(object):
+    """League-wide index of players.
+
+    The index is rebuilt by each update of a team, the lookups use dicts,
+    sorted last names and dates of birth. The last team of each identity is
+    kept apart from the rosters, so a move is found whichever of the two
+    teams is updated first.
+
+    """
+
+    _ATTR_INDEX = ('team', 'number', 'role', 'nationality')
+    _FUZZY_CUTOFF = 0.7
+
+    def __init__(self, players=()):
+        """Initial instance.
+
+        :param players: iterable of KHLPlayer instance.
+
+        """
+        self.players = []
+        self.moves = []
+        self._teams = {}
+        self._history = {}
+        self._last_team = {}
+        for player in players:
+            self._teams.setdefault(player.team, []).append(player)
+            self._last_team[get_identity(player)] = player.team
+        self._build()
+
+    def update(self, team, players):
+        """Replaces the players of the team.
+
+        A player of another team with the same identity is moved to the
+        team, the move is recorded.
+
+        :param team: team title;
+        :param players: iterable of KHLPlayer instance.
+
+        """
+        players = list(players)
+        for player in players:
+            identity = get_identity(player)
+            old_team = self._last_team.get(identity)
+            self._last_team[identity] = team
+            if old_team is None or old_team == team:
+                continue
+            self.moves.append(Move(player, old_team, team))
+            self._history.setdefault(identity, [old_team]).append(team)
+            if old_team in self._teams:
+                self._teams[old_team] = [
+                    item for item in self._teams[old_team]
+                    if get_identity(item) != identity
+                ]
+        self._teams[team] = players
+        self._build()
+
+    def get(self, team, number):
+        """Gets the player by team and number.
+
+        :param team: team title;
+        :param number: player number;
+        :return: KHLPlayer instance or None.
+
+        """
+        return self._by_team_number.get((team, number))
+
+    def history(self, player):
+        """Gets the teams of the player in the order of the moves.
+
+        :param player: KHLPlayer instance;
+        :return: list of team titles, the current team last.
+
+        """
+        identity = get_identity(player)
+        return list(self._history.get(identity, [self._last_team.get(
+            identity, player.team)]))
+
+    def find(self, name=None, prefix=None, fuzzy=None, team=None,
+             number=None, role=None, nationality=None, min_age=None,
+             max_age=None, on=None, limit=None):
+        """Finds the players, all conditions are combined.
+
+        :param name: full name or first and last name;
+        :param prefix: beginning of the last name;
+        :param fuzzy: last name with typos, the closest matches first;
+        :param team: team title;
+        :param number: player number;
+        :param role: player role;
+        :param nationality: player nationality;
+        :param min_age: min age in years;
+        :param max_age: max age in years;
+        :param on: date of the age, by default today;
+        :param limit: max number of players;
+        :return: list of KHLPlayer instance.
+
+        """
+        sets = []
+        if name is not None:
+            sets.append(self._by_name.get(normalize(name), frozenset()))
+        if prefix is not None:
+            key = normalize(prefix)
+            sets.append(frozenset(self._last_name_pos[
+                bisect_left(self._last_name_keys, key):
+                bisect_left(self._last_name_keys, key + '\uffff')
+            ]))
+        ranks = None
+        if fuzzy is not None:
+            ranks = self._fuzzy(normalize(fuzzy))
+            sets.append(frozenset(ranks))
+        for attr, value in zip(PlayerIndex._ATTR_INDEX,
+                               (team, number, role, nationality)):
+            if value is not None:
+                sets.append(self._index[attr].get(
+                    normalize(value) if attr in ('role', 'nationality')
+                    else value, frozenset()))
+        if min_age is not None or max_age is not None:
+            sets.append(self._age_range(min_age, max_age, on))
+        positions = frozenset.intersection(*sets) if sets \
+            else range(len(self.players))
+        positions = sorted(positions, key=(
+            lambda pos: (-ranks[pos], pos)) if ranks else None)
+        return [self.players[pos] for pos in positions[:limit]]
+
+    def _fuzzy(self, key):
+        """Finds the last names similar to the key.
+
+        :param key: normalized last name;
+        :return: dict (key - position, value - similarity ratio).
+
+        """
+        matcher = SequenceMatcher(b=key)
+        ranks = {}
+        for last_name, positions in self._last_names.items():
+            matcher.set_seq1(last_name)
+            if matcher.real_quick_ratio() < PlayerIndex._FUZZY_CUTOFF or \
+                    matcher.quick_ratio() < PlayerIndex._FUZZY_CUTOFF:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= PlayerIndex._FUZZY_CUTOFF:
+                for pos in positions:
+                    ranks[pos] = ratio
+        return ranks
+
+    def _age_range(self, min_age, max_age, on=None):
+        """Finds the players by age.
+
+        :return: frozenset of positions.
+
+        """
+        on = on if on else date.today()
+        low, high = 0, len(self._birth_keys)
+        if max_age is not None:
+            low = bisect_right(self._birth_keys,
+                               _years_before(on, max_age + 1).toordinal())
+        if min_age is not None:
+            high = bisect_right(self._birth_keys,
+                                _years_before(on, min_age).toordinal())
+        return frozenset(self._birth_pos[low:high])
+
+    def _build(self):
+        """Builds the indexes of the players."""
+
+        self.players = [player for players in self._teams.values()
+                        for player in players]
+        self._by_team_number = {}
+        self._by_name = {}
+        self._last_names = {}
+        self._index = dict((attr, {}) for attr in PlayerIndex._ATTR_INDEX)
+        births = []
+        for pos, player in enumerate(self.players):
+            self._by_team_number[(player.team, player.number)] = player
+            for name in (player.name,
+                         '%s %s' % (player.f_name, player.l_name)):
+                self._by_name.setdefault(normalize(name), set()).add(pos)
+            self._last_names.setdefault(
+                normalize(player.l_name), []).append(pos)
+            for attr in PlayerIndex._ATTR_INDEX:
+                value = getattr(player, attr)
+                if value is not None and attr in ('role', 'nationality'):
+                    value = normalize(value)
+                self._index[attr].setdefault(value, set()).add(pos)
+            birth = parse_date(player.date_birth)
+            if birth is not None:
+                births.append((birth.toordinal(), pos))
+        for index in [self._by_name] + list(self._index.values()):
+            for key in index:
+                index[key] = frozenset(index[key])
+        last_names = sorted(
+            (last_name, pos)
+            for last_name, positions in self._last_names.items()
+            for pos in positions
+        )
+        self._last_name_keys = [last_name for last_name, _ in last_names]
+        self._last_name_pos = [pos for _, pos in last_names]
+        births.sort()
+        self._birth_keys = [birth for birth, _ in births]
+        self._birth_pos = [pos for _, pos in births]
+
+    def __len__(self):
+        return len(self.players)
+
+    def __str__(self):
+        return '%s(%d players, %d teams)' % (
+            self.__class__.__name__, len(self.players), len(self._teams))
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def _years_before(day, years):
+    """Gets the same day the years before, 29 February becomes 28.
+
+    :param day: date instance;
+    :param years: number of years;
+    :return: date instance.
+
+    """
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
@@ -0,0 +1,463 @@
+"""Service module.
+
+This module serves the data of the teams over HTTP: JSON of the teams,
+players, matches and statistics and ICS feeds of the upcoming matches. The
+teams are kept in one KHLLeague shared by the request threads, responses are
+cached as ready-to-send bytes until the team is refreshed or the status of
+its next match changes. The scheduler refreshes each team around the start
+times of its matches instead of a fixed timer.
+
+Usage:
+
+    python -m khl_team.service --port 8080 Локомотив СКА
+
+Routes:
+
+    /teams                          teams of the service
+    /teams/<team>                   meta data
+    /teams/<team>/players           players with statistics
+    /teams/<team>/matches           matches with the current status
+    /teams/<team>/stats             team statistics
+    /teams/<team>/calendar.ics      upcoming matches
+    /metrics                        stages and service counters, Prometheus
+
+"""
+
+
+import argparse
+import hashlib
+import json
+import logging
+import threading
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+from khl_team import instrument as instruments
+from khl_team.exceptions import TeamNotExistError
+from khl_team.khl import KHLEvent, KHLLeague, KHLTeam
+from khl_team.transport import HTTPTransport
+
+
+logger = logging.getLogger(__name__)
+
+
+Response = namedtuple('Response', (
+    'status', 'content_type', 'body', 'etag', 'expires'))
+
+
+class RefreshScheduler(object):
+    """Scheduler refreshing the teams by the times of their matches.
+
+    A team is refreshed often while its match is played and until the final
+    score is published, at the start of its next match and at least once per
+    idle interval.
+
+    """
+
+    _LIVE = timedelta(minutes=5)
+    _IDLE = timedelta(hours=6)
+    _DURATION = timedelta(hours=3)
+    _PENDING = timedelta(hours=12)
+
+    def __init__(self, service, live=None, idle=None, duration=None,
+                 pending=None):
+        """Initial instance.
+
+        :param service: DataService instance;
+        :param live: timedelta between the refreshes of a played match;
+        :param idle: max timedelta between the refreshes;
+        :param duration: timedelta of a match;
+        :param pending: timedelta after the start of a match without score
+        to wait for the score.
+
+        """
+        self.service = service
+        self.live = live if live else RefreshScheduler._LIVE
+        self.idle = idle if idle else RefreshScheduler._IDLE
+        self.duration = duration if duration else RefreshScheduler._DURATION
+        self.pending = pending if pending else RefreshScheduler._PENDING
+        self.refreshes = 0
+        self._due = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def next_refresh(self, matches, now):
+        """Gets the time of the next refresh of the team.
+
+        :param matches: list of KHLEvent instance;
+        :param now: datetime instance;
+        :return: datetime instance.
+
+        """
+        due = now + self.idle
+        for match in matches:
+            start = match.datetime
+            if start > now:
+                due = min(due, start)
+            elif now < start + self.duration or (
+                    not match.score and now < start + self.pending):
+                return now + self.live
+        return due
+
+    def start(self):
+        """Starts the thread of the scheduler."""
+
+        now = datetime.today()
+        for title, team in self.service.league.teams.items():
+            self._due[title] = self.next_refresh(team.matches, now)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='khl_team-scheduler')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the thread of the scheduler."""
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        """Refreshes the due teams together, then sleeps until the next."""
+
+        while not self._stop.is_set():
+            now = datetime.today()
+            due = [title for title, at in self._due.items() if at <= now]
+            if due:
+                try:
+                    self.service.refresh(*due)
+                    self.refreshes += 1
+                except Exception:
+                    logger.exception('refresh of %s failed', due)
+                now = datetime.today()
+                teams = self.service.league.teams
+                for title in due:
+                    self._due[title] = max(
+                        self.next_refresh(teams[title].matches, now),
+                        now + self.live)
+            wait = min(self._due.values()) - now if self._due \
+                else self.idle
+            self._stop.wait(max(wait.total_seconds(), 0))
+
+    def __str__(self):
+        return '%s(%d teams, refreshes=%d)' % (
+            self.__class__.__name__, len(self._due), self.refreshes)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class DataService(object):
+    """Data of the teams served from one in-memory store."""
+
+    _JSON = 'application/json; charset=utf-8'
+    _ICS = 'text/calendar; charset=utf-8'
+    _TEXT = 'text/plain; version=0.0.4; charset=utf-8'
+    # Routes of the team: suffix of the path and the method building it.
+    _TEAM_ROUTES = {
+        '': '_get_meta',
+        '/players': '_get_players',
+        '/matches': '_get_matches',
+        '/stats': '_get_stats',
+        '/calendar.ics': '_get_calendar'
+    }
+    # Routes depending on the status of the matches.
+    _STATUS_ROUTES = ('/matches', '/calendar.ics')
+    # Routes built on each request.
+    _UNCACHED = ('/metrics',)
+
+    def __init__(self, *teams, league=None, schedule=True, scheduler=None,
+                 **kwargs):
+        """Initial instance.
+
+        :param teams: the sequence of title teams, by default all teams of
+        the index;
+        :param league: KHLLeague instance, by default the teams are loaded;
+        :param schedule: refresh the teams in the background;
+        :param scheduler: dict, keyword arguments of RefreshScheduler;
+        :param kwargs: keyword arguments of KHLLeague (base_url, cache,
+        workers, transport).
+
+        """
+        self.league = league if league else KHLLeague(*teams, **kwargs)
+        self.scheduler = RefreshScheduler(
+            self, **(scheduler if scheduler else {})) if schedule else None
+        self.hits = 0
+        self.misses = 0
+        self._responses = {}
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def get(self, path):
+        """Gets the response of the route.
+
+        :param path: path of the URL, quoted or not;
+        :return: Response instance.
+
+        """
+        path = '/' + unquote(path).strip('/')
+        response = self._responses.get(path)
+        now = datetime.today()
+        if response is not None and (
+                response.expires is None or response.expires > now):
+            self.hits += 1
+            return response
+        self.misses += 1
+        with self._lock:
+            response = self._build(path, now)
+            if response.status == 200 and \
+                    path not in DataService._UNCACHED:
+                self._responses[path] = response
+        return response
+
+    def refresh(self, *teams):
+        """Refreshes the teams and drops their cached responses.
+
+        The pages are fetched and parsed without the lock, so the requests
+        are served from the current data until the new data is applied.
+
+        :param teams: the sequence of title teams, by default all teams;
+        :return: dict (key - team title, value - RefreshDiff instance).
+
+        """
+        with self._refresh_lock:
+            data = self.league.fetch(*teams)
+            with self._lock:
+                diffs = self.league.apply(data)
+                self._invalidate(teams if teams else self.league.teams)
+        return diffs
+
+    def start(self, host='127.0.0.1', port=0):
+        """Starts the HTTP server and the scheduler in background threads.
+
+        :param host: host name;
+        :param port: port number, by default any free port;
+        :return: the instance.
+
+        """
+        self._server = ServiceServer((host, port), self)
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True, name='khl_team-service')
+        self._thread.start()
+        if self.scheduler:
+            self.scheduler.start()
+        return self
+
+    def stop(self):
+        """Stops the HTTP server and the scheduler."""
+
+        if self.scheduler:
+            self.scheduler.stop()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    @property
+    def url(self):
+        """Base URL of the started server."""
+
+        return 'http://%s:%d/' % self._server.server_address
+
+    def _invalidate(self, teams):
+        """Drops the cached responses of the teams and of the teams list."""
+
+        self._responses.pop('/teams', None)
+        for team in teams:
+            for suffix in DataService._TEAM_ROUTES:
+                self._responses.pop('/teams/%s%s' % (team, suffix), None)
+
+    def _build(self, path, now):
+        """Builds the response of the route.
+
+        :param path: unquoted path;
+        :param now: datetime of the request;
+        :return: Response instance.
+
+        """
+        parts = path.split('/', 3)
+        if path == '/teams':
+            return self._json([
+                {'team': team.team, 'location': team.location}
+                for team in self.league.teams.values()
+            ])
+        if path == '/metrics':
+            return self._metrics()
+        if len(parts) < 3 or parts[1] != 'teams':
+            return self._error(404, 'not found')
+        suffix = '/' + parts[3] if len(parts) == 4 else ''
+        method = DataService._TEAM_ROUTES.get(suffix)
+        if method is None:
+            return self._error(404, 'not found')
+        try:
+            team = self.league.get_team(parts[2])
+        except TeamNotExistError:
+            return self._error(404, 'team not found')
+        response = getattr(self, method)(team, now)
+        if suffix in DataService._STATUS_ROUTES:
+            response = response._replace(
+                expires=self._next_start(team, now))
+        return response
+
+    def _get_meta(self, team, now):
+        data = dict((attr, getattr(team, attr)) for attr in
+                    ('team', 'location') + KHLTeam._ATTR_META)
+        return self._json(data)
+
+    def _get_players(self, team, now):
+        return self._json([player.to_data() for player in team.players])
+
+    def _get_matches(self, team, now):
+        matches = []
+        for match in team.matches:
+            data = match.to_data()
+            data['datetime'] = match.datetime.isoformat()
+            data['is_finished'] = now > match.datetime
+            data['winner'] = match.winner if data['is_finished'] else None
+            matches.append(data)
+        return self._json(matches)
+
+    def _get_stats(self, team, now):
+        return self._json(team.stats)
+
+    def _get_calendar(self, team, now):
+        matches = [match for match in team.matches if match.datetime >= now]
+        return self._response(DataService._ICS, KHLEvent.gen_ics(matches))
+
+    def _metrics(self):
+        """Prometheus text of the stages and of the service counters."""
+
+        lines = [instruments.get_default().to_prometheus()]
+        for name, value in (('hits', self.hits), ('misses', self.misses)):
+            lines.append('# TYPE khl_team_service_%s_total counter\n'
+                         'khl_team_service_%s_total %d\n' % (
+                             name, name, value))
+        return self._response(DataService._TEXT,
+                              ''.join(lines).encode('utf-8'))
+
+    @staticmethod
+    def _next_start(team, now):
+        """Gets the start of the next match of the team or None."""
+
+        starts = [match.datetime for match in team.matches
+                  if match.datetime >= now]
+        return min(starts) if starts else None
+
+    @staticmethod
+    def _json(data, status=200):
+        return DataService._response(
+            DataService._JSON,
+            json.dumps(data, ensure_ascii=False).encode('utf-8'), status)
+
+    @staticmethod
+    def _error(status, message):
+        return DataService._json({'error': message}, status)
+
+    @staticmethod
+    def _response(content_type, body, status=200):
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+        return Response(status, content_type, body, etag, None)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def __str__(self):
+        return '%s(%d teams, hits=%d, misses=%d)' % (
+            self.__class__.__name__, len(self.league.teams), self.hits,
+            self.misses)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """Request handler sending the responses of DataService."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        response = self.server.service.get(urlsplit(self.path).path)
+        status = response.status
+        if status == 200 and \
+                self.headers.get('If-None-Match') == response.etag:
+            status = 304
+        self.send_response(status)
+        self.send_header('Content-Type', response.content_type)
+        self.send_header('ETag', response.etag)
+        body = response.body if status != 304 else b''
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format_, *args):
+        logger.debug(format_, *args)
+
+
+class ServiceServer(ThreadingHTTPServer):
+    """HTTP server of DataService."""
+
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        """Initial instance.
+
+        :param address: tuple(host, port);
+        :param service: DataService instance.
+
+        """
+        super().__init__(address, ServiceHandler)
+        self.service = service
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(
+        description='HTTP service of the KHL teams data.')
+    arg_parser.add_argument('teams', nargs='*',
+                            help='team titles, by default all teams')
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8080)
+    arg_parser.add_argument('--base-url', default=None,
+                            help='URL of the site or of its mirror')
+    arg_parser.add_argument('--workers', type=int, default=None,
+                            help='threads fetching the pages')
+    arg_parser.add_argument('--no-schedule', action='store_true',
+                            help='do not refresh the teams')
+    arg_parser.add_argument('--rate', type=float, default=None,
+                            help='requests per second to one host, by '
+                                 'default unlimited')
+    arg_parser.add_argument('--burst', type=int, default=1,
+                            help='requests sent without waiting for the '
+                                 'rate')
+    args = arg_parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    with HTTPTransport(rate=args.rate, burst=args.burst) as transport:
+        service = DataService(*args.teams, schedule=not args.no_schedule,
+                              base_url=args.base_url, workers=args.workers,
+                              transport=transport)
+        service.start(args.host, args.port)
+        logger.info('serving %d teams on %s', len(service.league.teams),
+                    service.url)
+        try:
+            service._thread.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,180 @@
+"""Snapshot module.
+
+This module saves the parsed team dicts (see KHLParser.get_data) to a
+compact versioned file and loads them back without network and without
+importing the parser.
+
+File layout (little-endian):
+    - magic b'KHLSNAP\\0';
+    - version (uint16), major and minor version of Python writing the file
+      (uint8 each), number of sections (uint32);
+    - index: for each section, name length (uint16), name (UTF-8), offset
+      (uint64) and length (uint32) of the data;
+    - sections: marshal data of the team dicts and of the teams index.
+
+The file is memory-mapped, only the requested sections are decoded. The
+marshal format may change between the versions of Python, so the file is
+read only by the Python version which wrote it. Invalid files raise
+SnapshotError.
+
+"""
+
+
+import marshal
+import mmap
+import struct
+import sys
+
+from khl_team.exceptions import SnapshotError
+
+
+MAGIC = b'KHLSNAP\0'
+VERSION = 2
+INDEX_SECTION = '\0index'
+_MARSHAL_VERSION = 4
+_HEADER = struct.Struct('<HBBI')
+_NAME = struct.Struct('<H')
+_ENTRY = struct.Struct('<QI')
+
+
+def save(path, teams_data, index=None):
+    """Writes the snapshot file.
+
+    :param path: file path;
+    :param teams_data: list of the team dicts;
+    :param index: dict of the teams index (see KHLParser.teams_index).
+
+    """
+    sections = [(team_data['team'], marshal.dumps(team_data,
+                                                  _MARSHAL_VERSION))
+                for team_data in teams_data]
+    if index is not None:
+        sections.append(
+            (INDEX_SECTION, marshal.dumps(index, _MARSHAL_VERSION)))
+    names = [name.encode('utf-8') for name, _ in sections]
+    offset = len(MAGIC) + _HEADER.size + sum(
+        _NAME.size + len(name) + _ENTRY.size for name in names)
+    with open(path, 'wb') as file_:
+        file_.write(MAGIC)
+        file_.write(_HEADER.pack(VERSION, sys.version_info[0],
+                                 sys.version_info[1], len(sections)))
+        for name, (_, data) in zip(names, sections):
+            file_.write(_NAME.pack(len(name)))
+            file_.write(name)
+            file_.write(_ENTRY.pack(offset, len(data)))
+            offset += len(data)
+        for _, data in sections:
+            file_.write(data)
+
+
+def load(path, teams=None):
+    """Reads the team dicts from the snapshot file.
+
+    :param path: file path;
+    :param teams: the sequence of title teams, by default all teams;
+    :return: list of the team dicts.
+
+    """
+    with Snapshot(path) as snapshot:
+        return [snapshot.get(team)
+                for team in (teams if teams else snapshot.teams)]
+
+
+class Snapshot(object):
+    """Memory-mapped snapshot file."""
+
+    def __init__(self, path):
+        """Initial instance.
+
+        :param path: file path.
+
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._sections = self._read_index()
+        except (ValueError, struct.error) as error:
+            self._file.close()
+            raise SnapshotError('%s: %s' % (path, error))
+
+    @property
+    def teams(self):
+        """Titles of the stored teams."""
+
+        return [name for name in self._sections if name != INDEX_SECTION]
+
+    @property
+    def index(self):
+        """Stored teams index or None."""
+
+        if INDEX_SECTION not in self._sections:
+            return None
+        return self._decode(INDEX_SECTION)
+
+    def get(self, team):
+        """Decodes the team dict.
+
+        :param team: team title;
+        :return: team dict.
+
+        """
+        if team not in self._sections:
+            raise SnapshotError('%s: no team "%s"' % (self.path, team))
+        return self._decode(team)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _decode(self, name):
+        offset, length = self._sections[name]
+        try:
+            return marshal.loads(self._map[offset:offset + length])
+        except (EOFError, ValueError, TypeError) as error:
+            raise SnapshotError('%s: section "%s": %s' % (
+                self.path, name, error))
+
+    def _read_index(self):
+        """Reads the sections index.
+
+        :return: dict (key - section name, value - tuple(offset, length)).
+
+        """
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError('not a snapshot file')
+        pos = len(MAGIC)
+        version, major, minor, count = _HEADER.unpack_from(self._map, pos)
+        if version != VERSION:
+            raise ValueError('unsupported version %d' % version)
+        if (major, minor) != sys.version_info[:2]:
+            raise ValueError('written by Python %d.%d' % (major, minor))
+        pos += _HEADER.size
+        size = len(self._map)
+        sections = {}
+        for _ in range(count):
+            name_len, = _NAME.unpack_from(self._map, pos)
+            pos += _NAME.size
+            if pos + name_len > size:
+                raise ValueError('truncated index')
+            name = self._map[pos:pos + name_len].decode('utf-8')
+            pos += name_len
+            offset, length = _ENTRY.unpack_from(self._map, pos)
+            pos += _ENTRY.size
+            if offset + length > size:
+                raise ValueError('truncated section "%s"' % name)
+            sections[name] = offset, length
+        return sections
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __str__(self):
+        return '%s(%s)' % (self.__class__.__name__, self.path)
+
+    def __repr__(self):
+        return self.__str__()
@@ -0,0 +1,242 @@
+"""Stats module.
+
+This module contains the typed statistics model. String values of the parsed
+pages ('48.3%', '1 / 1', '10.98') are converted to numbers once, each team's
+statistics are stored as one fixed-layout record of floats, so the league can
+be compared and ranked by columns.
+
+"""
+
+
+import math
+
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+
+
+Attempts = namedtuple('Attempts', ('made', 'attempted'))
+StatValue = namedtuple('StatValue', ('value', 'avg'))
+Split = namedtuple('Split', ('total', 'home', 'away'))
+PlayerStats = namedtuple('PlayerStats', (
+    'games', 'goals', 'tbl', 'assist', 'goals_pass', 'penalty'
+))
+
+# Record fields and titles of the team statistics on the page.
+FIELDS = (
+    ('games', 'Сыгранные матчи'),
+    ('wins', 'Победы'),
+    ('ot_wins', 'Победы в овертайме'),
+    ('so_wins', 'Победы по буллитам'),
+    ('draws', 'Ничьи'),
+    ('so_losses', 'Поражения по буллитам'),
+    ('ot_losses', 'Поражения в овертайме'),
+    ('losses', 'Поражения'),
+    ('points', 'Набранные очки'),
+    ('goals_for', 'Заброшенные шайбы'),
+    ('goals_against', 'Пропущенные шайбы'),
+    ('goal_diff', 'Разность шайб'),
+    ('shots', 'Броски по воротам'),
+    ('shots_against', 'Броски по воротам (соперник)'),
+    ('shooting', 'Реализация бросков'),
+    ('shooting_against', 'Реализация бросков (соперник)'),
+    ('penalty_minutes', 'Штрафное время'),
+    ('penalty_shots', 'Буллиты (назначенные / забитые)'),
+    ('penalty_shots_against', 'Буллиты (соперник) (назначенные / забитые)'),
+    ('faceoffs', 'Вбрасывания'),
+    ('faceoffs_won', 'Выигранные вбрасывания (% от возможных)'),
+    ('faceoffs_won_against',
+     'Выигранные вбрасывания (соперник) (% от возможных)'),
+    ('attendance', 'Зрители')
+)
+_FIELD_INDEX = dict((field, pos) for pos, (field, _) in enumerate(FIELDS))
+_TITLE_INDEX = dict((title, pos) for pos, (_, title) in enumerate(FIELDS))
+_SPLITS = ('total', 'home', 'away')
+# Slots of one split: value (attempted for shootouts), avg, made.
+_SLOTS = 3
+_WIDTH = _SLOTS * len(_SPLITS)
+_NAN = float('nan')
+
+
+@lru_cache(maxsize=4096)
+def to_number(value):
+    """Converts a string value of the page to a number.
+
+    The results are immutable and cached, the same values repeat across the
+    players and the teams. The unicode minus is read as '-', placeholders
+    like '-' or '—' and other text are not numbers.
+
+    :param value: string like '57', '−2', '10.98', '48.3%' or '1 / 1';
+    :return: int, float, Attempts or None for an empty or not numeric
+    value.
+
+    """
+    value = ''.join(value.split()).rstrip('%').replace(
+        ',', '.').replace('\u2212', '-')
+    if not value:
+        return None
+    try:
+        if '/' in value:
+            attempted, made = value.split('/', 1)
+            return Attempts(int(made), int(attempted))
+        try:
+            return int(value)
+        except ValueError:
+            number = float(value)
+            return number if math.isfinite(number) else None
+    except ValueError:
+        return None
+
+
+def parse_stat(values):
+    """Converts the parsed values of one statistic.
+
+    :param values: list of tuple(value, avg) or tuple of values (see
+    KHLParser._format_team_val);
+    :return: Split of StatValue.
+
+    """
+    if isinstance(values, list):
+        stat_values = [
+            StatValue(to_number(value[0]),
+                      to_number(value[1]) if len(value) > 1 else None)
+            for value in values
+        ]
+    else:
+        stat_values = [StatValue(to_number(value), None) for value in values]
+    stat_values += [StatValue(None, None)] * (3 - len(stat_values))
+    return Split(*stat_values[:3])
+
+
+class TeamStats(object):
+    """Fixed-layout record of the team statistics.
+
+    Each field takes the same slots of the array: value, avg and made for
+    total, home and away. Missing values are NaN.
+
+    """
+
+    __slots__ = ('team', 'row')
+
+    def __init__(self, team, stats):
+        """Initial instance.
+
+        :param team: team title;
+        :param stats: dict of KHLParser (key - title of the statistic, value -
+        parsed values), unknown titles are skipped.
+
+        """
+        self.team = team
+        self.row = array('d', [_NAN]) * (_WIDTH * len(FIELDS))
+        for title, values in stats.items():
+            pos = _TITLE_INDEX.get(title.strip())
+            if pos is None:
+                continue
+            for split_pos, stat in enumerate(parse_stat(values)):
+                offset = pos * _WIDTH + split_pos * _SLOTS
+                value = stat.value
+                if isinstance(value, Attempts):
+                    self.row[offset + 2] = value.made
+                    value = value.attempted
+                if value is not None:
+                    self.row[offset] = value
+                if stat.avg is not None:
+                    self.row[offset + 1] = stat.avg
+
+    def get(self, field, split='total', avg=False):
+        """Gets the value of the statistic.
+
+        :param field: field name (see FIELDS);
+        :param split: total, home or away;
+        :param avg: average/percentage instead of the value;
+        :return: float, NaN if missing.
+
+        """
+        return self.row[TeamStats._offset(field, split) + (1 if avg else 0)]
+
+    def get_attempts(self, field, split='total'):
+        """Gets the made/attempted pair of the shootout statistic.
+
+        :param field: field name (see FIELDS);
+        :param split: total, home or away;
+        :return: Attempts instance.
+
+        """
+        offset = TeamStats._offset(field, split)
+        return Attempts(self.row[offset + 2], self.row[offset])
+
+    def __getattr__(self, field):
+        """Gets the statistic as Split of StatValue."""
+
+        if field not in _FIELD_INDEX:
+            raise AttributeError(field)
+        values = []
+        for split in _SPLITS:
+            offset = TeamStats._offset(field, split)
+            value, avg, made = self.row[offset:offset + _SLOTS]
+            if made == made:
+                value = Attempts(made, value)
+            values.append(StatValue(
+                value if value == value else None,
+                avg if avg == avg else None
+            ))
+        return Split(*values)
+
+    @staticmethod
+    def _offset(field, split):
+        return _FIELD_INDEX[field] * _WIDTH + _SPLITS.index(split) * _SLOTS
+
+    def __str__(self):
+        return '%s(%s)' % (self.__class__.__name__, self.team)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def column(records, field, split='total', avg=False):
+    """Gets one statistic of all records.
+
+    :param records: iterable of TeamStats instance;
+    :param field: field name (see FIELDS);
+    :param split: total, home or away;
+    :param avg: average/percentage instead of the value;
+    :return: array of floats.
+
+    """
+    offset = TeamStats._offset(field, split) + (1 if avg else 0)
+    return array('d', (record.row[offset] for record in records))
+
+
+def rank(records, field, split='total', avg=False, reverse=True):
+    """Ranks the teams by the statistic, missing values are last.
+
+    :param records: iterable of TeamStats instance;
+    :param field: field name (see FIELDS);
+    :param split: total, home or away;
+    :param avg: average/percentage instead of the value;
+    :param reverse: the highest value first;
+    :return: list of tuple(team, value).
+
+    """
+    records = list(records)
+    values = column(records, field, split, avg)
+    order = sorted(
+        range(len(records)),
+        key=lambda pos: (values[pos] != values[pos],
+                         -values[pos] if reverse else values[pos])
+    )
+    return [(records[pos].team, values[pos]) for pos in order]
+
+
+def parse_player_stats(stats):
+    """Converts the parsed player statistics.
+
+    :param stats: dict of KHLParser with keys: games, goals, tbl, assist,
+    goals_pass, penalty;
+    :return: PlayerStats instance or None.
+
+    """
+    if not stats:
+        return None
+    return PlayerStats(*(to_number(stats[key]) if stats.get(key) else None
+                         for key in PlayerStats._fields))
@@ -0,0 +1,271 @@
+"""Store module.
+
+This module contains a columnar store of matches. Each match is stored once
+as a row of arrays: numeric ids of the teams, epoch timestamp and the score,
+so league-wide aggregations do not create KHLEvent objects.
+
+"""
+
+
+from array import array
+from calendar import timegm
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+
+Standing = namedtuple('Standing', (
+    'team', 'games', 'wins', 'losses', 'draws',
+    'goals_for', 'goals_against', 'goal_diff'
+))
+HeadToHead = namedtuple('HeadToHead', (
+    'games', 'wins', 'losses', 'draws', 'goals_for', 'goals_against'
+))
+
+
+class MatchStore(object):
+    """Columnar store of matches.
+
+    Columns: timestamps (epoch seconds), home/away (team ids) and
+    home_score/away_score (-1 for matches not played).
+
+    """
+
+    _EPOCH = datetime(1970, 1, 1)
+    _NO_SCORE = -1
+
+    def __init__(self, matches=()):
+        """Initial instance.
+
+        :param matches: iterable of KHLEvent instance.
+
+        """
+        self.teams = []
+        self._team_ids = {}
+        self._rows = {}
+        self.timestamps = array('q')
+        self.home = array('H')
+        self.away = array('H')
+        self.home_score = array('h')
+        self.away_score = array('h')
+        self.extend(matches)
+
+    def extend(self, matches):
+        """Adds matches, the matches already stored update their score.
+
+        :param matches: iterable of KHLEvent instance.
+
+        """
+        for match in matches:
+            played = match.is_finished and len(match.score) == 2
+            self.add_row(
+                timegm(match.datetime.timetuple()),
+                match.teams[0],
+                match.teams[1],
+                match.score[0] if played else MatchStore._NO_SCORE,
+                match.score[1] if played else MatchStore._NO_SCORE
+            )
+
+    def add_row(self, timestamp, home, away, home_score, away_score):
+        """Adds one match.
+
+        A match with the same time and teams updates the stored score.
+
+        :param timestamp: epoch seconds;
+        :param home: home team title;
+        :param away: away team title;
+        :param home_score: int, -1 if not played;
+        :param away_score: int, -1 if not played.
+
+        """
+        home_id, away_id = self.team_id(home), self.team_id(away)
+        key = (timestamp, home_id, away_id)
+        if key in self._rows:
+            row = self._rows[key]
+            self.home_score[row] = home_score
+            self.away_score[row] = away_score
+            return
+        self._rows[key] = len(self.timestamps)
+        self.timestamps.append(timestamp)
+        self.home.append(home_id)
+        self.away.append(away_id)
+        self.home_score.append(home_score)
+        self.away_score.append(away_score)
+
+    def team_id(self, team):
+        """Gets the numeric id of the team, a new id is assigned if needed.
+
+        :param team: team title;
+        :return: int.
+
+        """
+        try:
+            return self._team_ids[team]
+        except KeyError:
+            self._team_ids[team] = len(self.teams)
+            self.teams.append(team)
+            return self._team_ids[team]
+
+    def standings(self):
+        """Calculates the league table by the played matches.
+
+        :return: list of Standing sorted by wins, goal difference and goals.
+
+        """
+        size = len(self.teams)
+        games, wins, losses, draws, goals_for, goals_against = (
+            array('l', [0]) * size for _ in range(6)
+        )
+        for home, away, home_score, away_score in zip(
+                self.home, self.away, self.home_score, self.away_score):
+            if home_score < 0:
+                continue
+            games[home] += 1
+            games[away] += 1
+            goals_for[home] += home_score
+            goals_against[home] += away_score
+            goals_for[away] += away_score
+            goals_against[away] += home_score
+            if home_score > away_score:
+                wins[home] += 1
+                losses[away] += 1
+            elif home_score < away_score:
+                wins[away] += 1
+                losses[home] += 1
+            else:
+                draws[home] += 1
+                draws[away] += 1
+        table = [
+            Standing(
+                team, games[id_], wins[id_], losses[id_], draws[id_],
+                goals_for[id_], goals_against[id_],
+                goals_for[id_] - goals_against[id_]
+            ) for id_, team in enumerate(self.teams)
+        ]
+        table.sort(key=lambda row: (-row.wins, -row.goal_diff,
+                                    -row.goals_for, row.team))
+        return table
+
+    def goal_difference(self, team):
+        """Calculates the goal difference of the team.
+
+        :param team: team title;
+        :return: int.
+
+        """
+        result = self.head_to_head(team)
+        return result.goals_for - result.goals_against
+
+    def head_to_head(self, team, opponent=None):
+        """Calculates the record of the team against the opponent.
+
+        :param team: team title;
+        :param opponent: team title, by default all opponents;
+        :return: HeadToHead instance from the point of view of the team.
+
+        """
+        team_id = self._team_ids.get(team)
+        opponent_id = self._team_ids.get(opponent) if opponent else None
+        games = wins = losses = draws = goals_for = goals_against = 0
+        rows = self._team_rows(team_id, opponent_id, opponent is not None)
+        for row in rows:
+            scored, missed = self._scores(row, team_id)
+            games += 1
+            goals_for += scored
+            goals_against += missed
+            if scored > missed:
+                wins += 1
+            elif scored < missed:
+                losses += 1
+            else:
+                draws += 1
+        return HeadToHead(games, wins, losses, draws, goals_for,
+                          goals_against)
+
+    def form(self, team, last=5):
+        """Gets the results of the last played matches of the team.
+
+        :param team: team title;
+        :param last: number of matches;
+        :return: string of W (won), L (lose), D (draw), latest last.
+
+        """
+        team_id = self._team_ids.get(team)
+        rows = sorted(self._team_rows(team_id),
+                      key=lambda row: self.timestamps[row])[-last:]
+        form = []
+        for row in rows:
+            scored, missed = self._scores(row, team_id)
+            form.append(
+                'W' if scored > missed else 'L' if scored < missed else 'D')
+        return ''.join(form)
+
+    def to_events(self, rows=None):
+        """Creates KHLEvent objects of the matches.
+
+        :param rows: iterable of row numbers, by default all matches;
+        :return: list of KHLEvent instance.
+
+        """
+        from khl_team.khl import KHLEvent
+
+        events = []
+        for row in range(len(self)) if rows is None else rows:
+            date_time = self.get_datetime(row)
+            score = (self.home_score[row], self.away_score[row]) \
+                if self.home_score[row] >= 0 else ()
+            events.append(KHLEvent(
+                date=date_time.strftime('%d.%m.%Y'),
+                time=date_time.strftime('%H:%M'),
+                teams=(self.teams[self.home[row]],
+                       self.teams[self.away[row]]),
+                score=score
+            ))
+        return events
+
+    def get_datetime(self, row):
+        """Converts the timestamp of the row to datetime.
+
+        :param row: row number;
+        :return: datetime instance.
+
+        """
+        return MatchStore._EPOCH + timedelta(seconds=self.timestamps[row])
+
+    def _team_rows(self, team_id, opponent_id=None, with_opponent=False):
+        """Gets the played rows of the team.
+
+        :param team_id: team id;
+        :param opponent_id: opponent id;
+        :param with_opponent: only matches with the opponent;
+        :return: generator of row numbers.
+
+        """
+        if team_id is None or (with_opponent and opponent_id is None):
+            return
+        for row, (home, away, home_score) in enumerate(
+                zip(self.home, self.away, self.home_score)):
+            if home_score < 0 or team_id not in (home, away):
+                continue
+            if with_opponent and opponent_id not in (home, away):
+                continue
+            yield row
+
+    def _scores(self, row, team_id):
+        """Gets the score of the row from the point of view of the team.
+
+        :return: tuple(scored, missed).
+
+        """
+        if self.home[row] == team_id:
+            return self.home_score[row], self.away_score[row]
+        return self.away_score[row], self.home_score[row]
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __str__(self):
+        return '%s(%d matches, %d teams)' % (
+            self.__class__.__name__, len(self), len(self.teams))
+
+    def __repr__(self):
+        return self.__str__()
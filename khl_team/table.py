@@ -0,0 +1,111 @@
+"""Table module.
+
+This module extracts the tables of championat.com pages row by row. Each
+'tr' tag is read once, the cells are mapped to the keys by the headers of
+the table, so an empty or a missing cell does not shift the following rows.
+
+Usage:
+
+    table = Table(('number', r'^№'), ('name', r'^игрок'))
+    for row in table.rows(soup):
+        print(row['number'], row['name'])
+
+"""
+
+
+import re
+
+from operator import itemgetter
+
+
+class Table(object):
+    """Columns of the table mapped by the headers."""
+
+    def __init__(self, *columns, collapse=False):
+        """Initial instance.
+
+        :param columns: tuples(key, regex of the header), a column missing
+        in the headers is read by its position in columns;
+        :param collapse: collapse the whitespace inside the cells, by
+        default the cells are stripped only.
+
+        """
+        self.keys = tuple(key for key, _ in columns)
+        self.collapse = collapse
+        self._patterns = tuple(
+            re.compile(pattern, re.IGNORECASE) for _, pattern in columns)
+
+    def rows(self, soup):
+        """Yields the rows of the table.
+
+        Rows shorter than the mapped columns and rows of empty cells are
+        skipped.
+
+        :param soup: BeautifulSoup instance or tag of the table;
+        :return: generator of dict (key - column key, value - cell text).
+
+        """
+        keys = self.keys
+        positions = tuple(range(len(keys)))
+        getter = itemgetter(*positions)
+        width = len(positions)
+        for cells, is_header in iter_cells(soup, self.collapse):
+            if is_header:
+                positions = self._map(cells)
+                getter = itemgetter(*positions)
+                width = max(positions) + 1
+            elif len(cells) >= width and any(cells):
+                yield dict(zip(keys, getter(cells)))
+
+    def _map(self, headers):
+        """Maps the keys to the positions of the headers.
+
+        :param headers: list of the header texts;
+        :return: tuple of the positions in the order of the keys.
+
+        """
+        return tuple(
+            next((pos for pos, header in enumerate(headers)
+                  if pattern.search(header)), index)
+            for index, pattern in enumerate(self._patterns)
+        )
+
+    def __str__(self):
+        return '%s%s' % (self.__class__.__name__, self.keys)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def iter_cells(soup, collapse=False):
+    """Yields the cells of each row.
+
+    A cell spanning several columns is followed by empty cells, so the
+    positions match the headers.
+
+    :param soup: BeautifulSoup instance or tag of the table;
+    :param collapse: collapse the whitespace inside the cells;
+    :return: generator of tuple(list of the cell texts, the row is the
+    header).
+
+    """
+    for tr in soup.find_all('tr'):
+        cells = []
+        is_header = True
+        for cell in tr.contents:
+            name = cell.name
+            if name != 'td' and name != 'th':
+                continue
+            # The text of a cell with one string is read without the
+            # traversal of the descendants.
+            text = cell.string
+            if text is None:
+                text = cell.get_text()
+            cells.append(' '.join(text.split()) if collapse else text.strip())
+            if cell.attrs:
+                span = cell.attrs.get('colspan')
+                if span and span.isdigit() and int(span) > 1:
+                    cells.extend([''] * (int(span) - 1))
+            is_header = is_header and name == 'th'
+        if cells:
+            yield cells, is_header
@@ -0,0 +1,717 @@
+"""Transport module.
+
+This module contains the HTTP transports of KHLParser. The default transport
+keeps a pool of persistent connections per host, decodes gzip/deflate
+responses, retries failed requests with exponential backoff and jitter and
+limits the request rate by a token bucket per host.
+
+RecordingTransport saves the pages fetched by another transport to
+PageArchive, ReplayTransport serves the pages of the archive, so a load can
+run against captured traffic without network.
+
+A transport is shared by all parsers of the process unless a parser is given
+its own one, the parsers limiting the request rate share a transport per
+rate. The coroutine afetch serves the asyncio API of the parser:
+HTTPTransport sends the requests by asyncio streams through a pool of
+connections of the running event loop, other transports run fetch in the
+default executor.
+
+"""
+
+
+import asyncio
+import gzip
+import http.client
+import io
+import random
+import ssl
+import threading
+import time
+import weakref
+import zlib
+
+from urllib.parse import urljoin, urlsplit
+
+from khl_team.exceptions import TransportError
+
+
+class RateLimiter(object):
+    """Token bucket limiting the request rate per host."""
+
+    def __init__(self, rate, burst=1):
+        """Initial instance.
+
+        :param rate: requests per second;
+        :param burst: max number of requests sent without waiting.
+
+        """
+        self.rate = float(rate)
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host=None):
+        """Takes a token, waits until the token is available.
+
+        :param host: host name, each host has its own bucket.
+
+        """
+        delay = self._take(host)
+        while delay:
+            time.sleep(delay)
+            delay = self._take(host)
+
+    async def aacquire(self, host=None):
+        """Takes a token, the event loop is not blocked while waiting.
+
+        :param host: host name, each host has its own bucket.
+
+        """
+        delay = self._take(host)
+        while delay:
+            await asyncio.sleep(delay)
+            delay = self._take(host)
+
+    def _take(self, host):
+        """Takes a token if available.
+
+        :param host: host name;
+        :return: 0 if the token is taken, otherwise seconds to wait.
+
+        """
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(host, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[host] = (tokens - 1, now)
+                return 0
+            self._buckets[host] = (tokens, now)
+            return (1 - tokens) / self.rate
+
+    def __str__(self):
+        return '%s(%s/s, burst=%d)' % (
+            self.__class__.__name__, self.rate, self.burst)
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class Transport(object):
+    """Base transport.
+
+    Subclasses implement fetch returning tuple(status, headers, body).
+
+    """
+
+    def fetch(self, url, headers=None):
+        """Requests the page.
+
+        :param url: page URL;
+        :param headers: dict of request headers;
+        :return: tuple(status, headers, body), body is empty if the page is
+        not modified.
+
+        """
+        raise NotImplementedError
+
+    async def afetch(self, url, headers=None):
+        """Requests the page from the coroutine.
+
+        By default fetch runs in the default executor of the event loop.
+
+        :param url: page URL;
+        :param headers: dict of request headers;
+        :return: tuple(status, headers, body).
+
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.fetch, url, headers)
+
+    def close(self):
+        """Releases the resources of the transport."""
+
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __str__(self):
+        return '%s()' % self.__class__.__name__
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class HTTPTransport(Transport):
+    """Pooled keep-alive HTTP transport."""
+
+    _HEADERS = {
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive',
+        'User-Agent': 'khl_team'
+    }
+    _CONNECTIONS = {
+        'http': http.client.HTTPConnection,
+        'https': http.client.HTTPSConnection
+    }
+    _RETRY_STATUS = (429, 500, 502, 503, 504)
+    _REDIRECT_STATUS = (301, 302, 303, 307, 308)
+    _MAX_REDIRECTS = 5
+
+    def __init__(self, timeout=10, retries=3, backoff=0.5, max_backoff=30,
+                 pool_size=4, rate=None, burst=1, limiter=None):
+        """Initial instance.
+
+        :param timeout: timeout of connecting and of each socket operation
+        in seconds;
+        :param retries: number of retries of the failed request (connection
+        errors and statuses of _RETRY_STATUS);
+        :param backoff: base delay of the retry in seconds, doubled by each
+        attempt, the actual delay is random up to the value;
+        :param max_backoff: max delay of the retry in seconds;
+        :param pool_size: max number of idle connections per host;
+        :param rate: requests per second to one host, by default unlimited;
+        :param burst: max number of requests sent without waiting;
+        :param limiter: RateLimiter instance shared with other transports,
+        overrides rate and burst.
+
+        """
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self.limiter = limiter if limiter else (
+            RateLimiter(rate, burst) if rate else None)
+        self.requests = 0
+        self.retried = 0
+        self.reused = 0
+        self._pool = {}
+        self._async_pools = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def fetch(self, url, headers=None):
+        """Requests the page, redirects are followed.
+
+        :param url: page URL;
+        :param headers: dict of request headers;
+        :return: tuple(status, headers, body), body is empty if the page is
+        not modified.
+
+        """
+        for _ in range(HTTPTransport._MAX_REDIRECTS + 1):
+            status, resp_headers, body = self._retry(url, headers)
+            if status not in HTTPTransport._REDIRECT_STATUS:
+                return HTTPTransport._result(url, status, resp_headers, body)
+            url = urljoin(url, resp_headers['Location'])
+        raise TransportError('%s: too many redirects' % url)
+
+    async def afetch(self, url, headers=None):
+        """Requests the page by asyncio streams, redirects are followed.
+
+        :param url: page URL;
+        :param headers: dict of request headers;
+        :return: tuple(status, headers, body), body is empty if the page is
+        not modified.
+
+        """
+        for _ in range(HTTPTransport._MAX_REDIRECTS + 1):
+            status, resp_headers, body = await self._aretry(url, headers)
+            if status not in HTTPTransport._REDIRECT_STATUS:
+                return HTTPTransport._result(url, status, resp_headers, body)
+            url = urljoin(url, resp_headers['Location'])
+        raise TransportError('%s: too many redirects' % url)
+
+    def close(self):
+        """Closes the idle connections."""
+
+        with self._lock:
+            pool, self._pool = self._pool, {}
+            async_pools = list(self._async_pools.values())
+            self._async_pools = weakref.WeakKeyDictionary()
+        for connections in pool.values():
+            for connection in connections:
+                connection.close()
+        for async_pool in async_pools:
+            for streams in async_pool.values():
+                for _, writer in streams:
+                    writer.close()
+
+    def _retry(self, url, headers):
+        """Sends the request, failed requests are retried.
+
+        :return: tuple(status, headers, body).
+
+        """
+        parts = urlsplit(url)
+        for attempt in range(self.retries + 1):
+            if self.limiter:
+                self.limiter.acquire(parts.netloc)
+            delay = None
+            try:
+                status, resp_headers, body = self._request(parts, headers)
+            except (OSError, http.client.HTTPException) as error:
+                if attempt == self.retries:
+                    raise TransportError('%s: %s' % (url, error))
+            else:
+                if status not in HTTPTransport._RETRY_STATUS or \
+                        attempt == self.retries:
+                    return status, resp_headers, body
+                delay = HTTPTransport._retry_after(resp_headers)
+            with self._lock:
+                self.retried += 1
+            time.sleep(delay if delay is not None else self._backoff(attempt))
+
+    async def _aretry(self, url, headers):
+        """Sends the request from the coroutine, failed requests are retried.
+
+        :return: tuple(status, headers, body).
+
+        """
+        parts = urlsplit(url)
+        for attempt in range(self.retries + 1):
+            if self.limiter:
+                await self.limiter.aacquire(parts.netloc)
+            delay = None
+            try:
+                status, resp_headers, body = await self._arequest(
+                    parts, headers)
+            except (OSError, EOFError, asyncio.TimeoutError,
+                    http.client.HTTPException, ValueError) as error:
+                if attempt == self.retries:
+                    raise TransportError('%s: %s' % (url, error))
+            else:
+                if status not in HTTPTransport._RETRY_STATUS or \
+                        attempt == self.retries:
+                    return status, resp_headers, body
+                delay = HTTPTransport._retry_after(resp_headers)
+            with self._lock:
+                self.retried += 1
+            await asyncio.sleep(
+                delay if delay is not None else self._backoff(attempt))
+
+    async def _arequest(self, parts, headers):
+        """Sends one request through the pooled streams of the event loop.
+
+        :param parts: SplitResult of the URL;
+        :param headers: dict of request headers;
+        :return: tuple(status, headers, body).
+
+        """
+        path = parts.path if parts.path else '/'
+        if parts.query:
+            path += '?' + parts.query
+        request_headers = dict(HTTPTransport._HEADERS, Host=parts.netloc)
+        request_headers.update(headers if headers else {})
+        message = ''.join(
+            ['GET %s HTTP/1.1\r\n' % path] +
+            ['%s: %s\r\n' % item for item in request_headers.items()] +
+            ['\r\n']
+        ).encode('latin-1')
+        while True:
+            (reader, writer), reused = await self._aacquire(parts)
+            try:
+                writer.write(message)
+                await asyncio.wait_for(writer.drain(), self.timeout)
+                status, resp_headers, body, will_close = \
+                    await asyncio.wait_for(
+                        HTTPTransport._aread(reader), self.timeout)
+            except (ConnectionResetError, BrokenPipeError,
+                    asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            with self._lock:
+                self.requests += 1
+                self.reused += reused
+            if will_close:
+                writer.close()
+            else:
+                self._arelease(parts, (reader, writer))
+            return status, resp_headers, body
+
+    async def _aacquire(self, parts):
+        """Gets idle streams of the host or opens a new connection.
+
+        :param parts: SplitResult of the URL;
+        :return: tuple(tuple(reader, writer), reused).
+
+        """
+        key = (parts.scheme, parts.netloc)
+        with self._lock:
+            streams = self._async_pool().get(key)
+            while streams:
+                reader, writer = streams.pop()
+                if not writer.is_closing() and not reader.at_eof():
+                    return (reader, writer), True
+                writer.close()
+        if parts.scheme not in HTTPTransport._CONNECTIONS:
+            raise TransportError('unsupported scheme "%s"' % parts.scheme)
+        https = parts.scheme == 'https'
+        streams = await asyncio.wait_for(asyncio.open_connection(
+            parts.hostname,
+            parts.port if parts.port else (443 if https else 80),
+            ssl=ssl.create_default_context() if https else None
+        ), self.timeout)
+        return streams, False
+
+    def _arelease(self, parts, streams):
+        """Returns the streams to the pool of the event loop.
+
+        :param parts: SplitResult of the URL;
+        :param streams: tuple(reader, writer).
+
+        """
+        key = (parts.scheme, parts.netloc)
+        with self._lock:
+            pool = self._async_pool().setdefault(key, [])
+            if len(pool) < self.pool_size:
+                pool.append(streams)
+                return
+        streams[1].close()
+
+    def _async_pool(self):
+        """Gets the pool of the running event loop, the lock is held.
+
+        :return: dict (key - tuple(scheme, netloc), value - list of
+        tuple(reader, writer)).
+
+        """
+        loop = asyncio.get_running_loop()
+        if loop not in self._async_pools:
+            self._async_pools[loop] = {}
+        return self._async_pools[loop]
+
+    @staticmethod
+    async def _aread(reader):
+        """Reads the response.
+
+        :param reader: StreamReader instance;
+        :return: tuple(status, headers, body, will_close).
+
+        """
+        line = await reader.readline()
+        if not line:
+            raise http.client.RemoteDisconnected('connection closed')
+        version, status = line.decode('latin-1').split(None, 2)[:2]
+        lines = []
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            lines.append(line)
+        headers = http.client.parse_headers(io.BytesIO(b''.join(lines)))
+        status = int(status)
+        connection = headers.get('Connection', '').lower()
+        will_close = connection == 'close' or (
+            version == 'HTTP/1.0' and connection != 'keep-alive')
+        if status in (204, 304) or 100 <= status < 200:
+            body = b''
+        elif 'chunked' in headers.get('Transfer-Encoding', '').lower():
+            body = await HTTPTransport._aread_chunked(reader)
+        elif headers.get('Content-Length') is not None:
+            body = await reader.readexactly(int(headers['Content-Length']))
+        else:
+            body = await reader.read()
+            will_close = True
+        return status, headers, body, will_close
+
+    @staticmethod
+    async def _aread_chunked(reader):
+        """Reads the body of the chunked response.
+
+        :param reader: StreamReader instance;
+        :return: byte string.
+
+        """
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0].strip(), 16)
+            if not size:
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        return b''.join(chunks)
+
+    def _request(self, parts, headers):
+        """Sends one request through the pooled connection.
+
+        A reused connection closed by the server is replaced by a new one
+        once without a retry.
+
+        :param parts: SplitResult of the URL;
+        :param headers: dict of request headers;
+        :return: tuple(status, headers, body).
+
+        """
+        key = (parts.scheme, parts.netloc)
+        path = parts.path if parts.path else '/'
+        if parts.query:
+            path += '?' + parts.query
+        while True:
+            connection, reused = self._acquire(key)
+            try:
+                connection.request(
+                    'GET', path,
+                    headers=dict(HTTPTransport._HEADERS, **(
+                        headers if headers else {}))
+                )
+                response = connection.getresponse()
+                body = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError,
+                    BrokenPipeError):
+                connection.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+            with self._lock:
+                self.requests += 1
+                self.reused += reused
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(key, connection)
+            return response.status, response.headers, body
+
+    def _acquire(self, key):
+        """Gets an idle connection of the host or creates a new one.
+
+        :param key: tuple(scheme, netloc);
+        :return: tuple(connection, reused).
+
+        """
+        with self._lock:
+            connections = self._pool.get(key)
+            if connections:
+                return connections.pop(), True
+        try:
+            connection_class = HTTPTransport._CONNECTIONS[key[0]]
+        except KeyError:
+            raise TransportError('unsupported scheme "%s"' % key[0])
+        return connection_class(key[1], timeout=self.timeout), False
+
+    def _release(self, key, connection):
+        """Returns the connection to the pool.
+
+        :param key: tuple(scheme, netloc);
+        :param connection: HTTPConnection instance.
+
+        """
+        with self._lock:
+            connections = self._pool.setdefault(key, [])
+            if len(connections) < self.pool_size:
+                connections.append(connection)
+                return
+        connection.close()
+
+    def _backoff(self, attempt):
+        """Calculates the delay of the retry (full jitter).
+
+        :param attempt: number of the failed attempt from 0;
+        :return: seconds.
+
+        """
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    @staticmethod
+    def _result(url, status, headers, body):
+        """Checks the status and decodes the body of the final response.
+
+        :return: tuple(status, headers, body).
+
+        """
+        if status != 304 and not 200 <= status < 300:
+            raise TransportError('%s: HTTP %d' % (url, status))
+        return status, headers, HTTPTransport._decode(headers, body)
+
+    @staticmethod
+    def _retry_after(headers):
+        """Gets the delay of Retry-After header in seconds or None."""
+
+        value = headers.get('Retry-After')
+        if value and value.strip().isdigit():
+            return int(value)
+        return None
+
+    @staticmethod
+    def _decode(headers, body):
+        """Decodes the compressed body.
+
+        :param headers: response headers;
+        :param body: byte string;
+        :return: byte string.
+
+        """
+        encoding = headers.get('Content-Encoding', '').strip().lower()
+        if not body or encoding in ('', 'identity'):
+            return body
+        if encoding == 'gzip':
+            return gzip.decompress(body)
+        if encoding == 'deflate':
+            try:
+                return zlib.decompress(body)
+            except zlib.error:
+                return zlib.decompress(body, -zlib.MAX_WBITS)
+        raise TransportError('unsupported encoding "%s"' % encoding)
+
+    def __str__(self):
+        return '%s(requests=%d, reused=%d, retried=%d)' % (
+            self.__class__.__name__, self.requests, self.reused,
+            self.retried)
+
+
+class RecordingTransport(Transport):
+    """Transport saving the fetched pages to the archive."""
+
+    def __init__(self, archive, transport=None):
+        """Initial instance.
+
+        :param archive: PageArchive instance opened for writing;
+        :param transport: Transport instance fetching the pages, by default
+        a new HTTPTransport.
+
+        """
+        self.archive = archive
+        self.transport = transport if transport else HTTPTransport()
+
+    def fetch(self, url, headers=None):
+        return self._record(url, self.transport.fetch(url, headers))
+
+    async def afetch(self, url, headers=None):
+        return self._record(url, await self.transport.afetch(url, headers))
+
+    def close(self):
+        """Closes the archive and the transport."""
+
+        self.archive.close()
+        self.transport.close()
+
+    def _record(self, url, response):
+        """Adds the response to the archive, not modified pages are skipped.
+
+        :return: the response.
+
+        """
+        status, headers, body = response
+        if status != 304:
+            self.archive.add(url, status, headers, body)
+        return response
+
+    def __str__(self):
+        return '%s(%s)' % (self.__class__.__name__, self.archive)
+
+
+class ReplayTransport(Transport):
+    """Transport serving the pages of the archive.
+
+    Pages are matched by the path and the query of the URL, so the archive
+    recorded from the site serves any base URL. Conditional requests with
+    the recorded ETag get 304.
+
+    """
+
+    def __init__(self, archive, latency=0, jitter=0):
+        """Initial instance.
+
+        :param archive: PageArchive instance;
+        :param latency: delay of each response in seconds;
+        :param jitter: max random delay added to the latency in seconds.
+
+        """
+        self.archive = archive
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+
+    def fetch(self, url, headers=None):
+        delay = self._get_delay()
+        if delay:
+            time.sleep(delay)
+        return self._replay(url, headers)
+
+    async def afetch(self, url, headers=None):
+        delay = self._get_delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return self._replay(url, headers)
+
+    def close(self):
+        self.archive.close()
+
+    def _get_delay(self):
+        return self.latency + (
+            random.uniform(0, self.jitter) if self.jitter else 0)
+
+    def _replay(self, url, headers=None):
+        """Gets the recorded response.
+
+        :return: tuple(status, headers, body).
+
+        """
+        response = self.archive.get(url)
+        if response is None:
+            raise TransportError('%s: not in the archive' % url)
+        self.requests += 1
+        status, resp_headers, body = response
+        etag = resp_headers.get('ETag')
+        if etag and headers and headers.get('If-None-Match') == etag:
+            return 304, resp_headers, b''
+        return status, resp_headers, body
+
+    def __str__(self):
+        return '%s(%s, latency=%s)' % (
+            self.__class__.__name__, self.archive, self.latency)
+
+
+_default = None
+_limited = {}
+_default_lock = threading.Lock()
+
+
+def get_default(rate=None, burst=1):
+    """Gets the transport shared by the parsers of the process.
+
+    The transport without a rate is not limited. A transport with a rate is
+    shared by all parsers with the same rate and burst, so the limit holds
+    for the whole process.
+
+    :param rate: requests per second to one host, by default unlimited;
+    :param burst: max number of requests sent without waiting;
+    :return: HTTPTransport instance.
+
+    """
+    global _default
+    with _default_lock:
+        if rate:
+            key = (float(rate), burst)
+            if key not in _limited:
+                _limited[key] = HTTPTransport(rate=rate, burst=burst)
+            return _limited[key]
+        if _default is None:
+            _default = HTTPTransport()
+        return _default
+
+
+def set_default(transport):
+    """Replaces the transport shared by the parsers of the process.
+
+    :param transport: Transport instance, None for a new HTTPTransport.
+
+    """
+    global _default
+    with _default_lock:
+        _default = transport
@@ -22,6 +22,9 @@ setup(
     description='Interface for obtaining data about KHL teams',
     long_description=read('README.rst'),
     install_requires=['beautifulsoup4==4.5.3', 'icalendar==3.11.2'],
+    entry_points={
+        'console_scripts': ['khl-team = khl_team.cli:main']
+    },
     classifiers=[
         'Development Status :: 5 - Production/Stable',
         'Intended Audience :: Developers',